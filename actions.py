@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-from typing import Optional, Tuple, TYPE_CHECKING
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
 import color
 import exceptions
+import game_config
 
 if TYPE_CHECKING:
    from engine import Engine
    from entity import Actor, Entity, Item
 
+# 一个多回合动作最多执行的回合数，与录像中记录回合数的字段范围一致
+MULTI_TURN_LIMIT = 0xFFFF
+
+# 自动探索先在玩家四周这么多格的窗口内找探索边界，找不到时才计算整张地图的距离图
+EXPLORE_MARGIN = 2 * game_config.fov_radius
+
 class Action:
     def __init__(self, entity: Actor) -> None:
         super().__init__()
@@ -40,17 +51,21 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Your inventory is full.")
+        # 同一格上有多件物品时按名字选择，结果不依赖集合的迭代顺序
+        items_here = [
+            item for item in self.engine.game_map.items
+            if actor_location_x == item.x and actor_location_y == item.y
+        ]
+        for item in sorted(items_here, key=lambda item: item.name):
+            if len(inventory.items) >= inventory.capacity:
+                raise exceptions.Impossible("Your inventory is full.")
 
-                self.engine.game_map.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+            self.engine.game_map.entities.remove(item)
+            item.parent = self.entity.inventory
+            inventory.items.append(item)
 
-                self.engine.message_log.add_message(f"You picked up the {item.name}!")
-                return
+            self.engine.message_log.add_message(f"You picked up the {item.name}!")
+            return
 
         raise exceptions.Impossible("There is nothing here to pick up.")
 
@@ -187,4 +202,110 @@ class BumpAction(ActionWithDirection):
             return MeleeAction(self.entity, self.dx, self.dy).perform()
         # 否则，进行移动
         else:
-            return MovementAction(self.entity, self.dx, self.dy).perform()
\ No newline at end of file
+            return MovementAction(self.entity, self.dx, self.dy).perform()
+
+
+# 连续执行多个回合的动作
+class MultiTurnAction(Action):
+    """由一连串单回合动作组成的动作，例如奔跑和前往指定地点。
+
+    事件处理器会依次执行 `steps()` 产生的动作，每一步之后照常运行敌人回合和视野更新，
+    每帧最多执行几个回合。发现新的怪物、出现新消息或某一步无法执行时停止。
+    """
+
+    # 最多执行的回合数，None 表示不限；玩家中途按键停止时设为已执行的回合数，录像重放时据此停下
+    max_turns: Optional[int] = None
+
+    def steps(self) -> Iterator[Action]:
+        raise NotImplementedError()
+
+    def perform(self) -> None:
+        raise NotImplementedError("MultiTurnAction is performed step by step by the event handler.")
+
+# 朝一个方向奔跑
+class RunAction(MultiTurnAction):
+    def __init__(self, entity: Actor, dx: int, dy: int):
+        super().__init__(entity)
+        self.dx = dx
+        self.dy = dy
+
+    def steps(self) -> Iterator[Action]:
+        game_map = self.engine.game_map
+        while True:
+            yield MovementAction(self.entity, self.dx, self.dy)
+            # 走到楼梯或物品上时停下
+            position = self.entity.x, self.entity.y
+            if position == game_map.downstairs_location:
+                return
+            if any((item.x, item.y) == position for item in game_map.items):
+                return
+
+# 沿着已探索区域前往指定地点
+class TravelAction(MultiTurnAction):
+    def __init__(self, entity: Actor, dest_x: int, dest_y: int):
+        super().__init__(entity)
+        self.dest_xy = dest_x, dest_y
+        self.path: List[Tuple[int, int]] = self.compute_path()
+
+    def compute_path(self) -> List[Tuple[int, int]]:
+        """在已探索的可行走格子上计算一次路径，整个旅程都复用这条路径。"""
+        game_map = self.engine.game_map
+        if not game_map.in_bounds(*self.dest_xy):
+            return []
+        # 路径只经过已探索的格子，在已探索区域的外接矩形内寻路即可
+        window = game_map.explored_window()
+        dest_x, dest_y = self.dest_xy
+        if window is None or not (window[0].start <= dest_x < window[0].stop and window[1].start <= dest_y < window[1].stop):
+            return []
+        x0, y0 = window[0].start, window[1].start
+        cost = (game_map.tiles["walkable"][window] & game_map.explored[window]).astype(np.int8)
+        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
+        pathfinder = tcod.path.Pathfinder(graph)
+        pathfinder.add_root((self.entity.x - x0, self.entity.y - y0))
+        return [(x + x0, y + y0) for x, y in pathfinder.path_to((dest_x - x0, dest_y - y0))[1:].tolist()]
+
+    def steps(self) -> Iterator[Action]:
+        if not self.path:
+            raise exceptions.Impossible("You don't know a way there.")
+        for x, y in self.path:
+            yield MovementAction(self.entity, x - self.entity.x, y - self.entity.y)
+
+# 自动探索：沿着到探索边界的距离图下坡行走
+class AutoExploreAction(MultiTurnAction):
+    def steps(self) -> Iterator[Action]:
+        # game_map 在开始游戏时才加载，这里不在模块顶层导入
+        from game_map import UNREACHABLE
+
+        game_map = self.engine.game_map
+        if game_map.visible_actors_near(
+            self.entity.x, self.entity.y, game_config.fov_radius, exclude=self.entity
+        ):
+            raise exceptions.Impossible("You can't explore with enemies in view.")
+
+        while True:
+            # 先在附近找探索边界，附近没有时才使用整张地图的距离图
+            (window_x, window_y), distance = game_map.explore_distance_near(
+                self.entity.x, self.entity.y, EXPLORE_MARGIN
+            )
+            x, y = self.entity.x - window_x.start, self.entity.y - window_y.start
+            if distance[x, y] >= 2 * EXPLORE_MARGIN:
+                (window_x, window_y), distance = game_map.explore_distance()
+                x, y = self.entity.x - window_x.start, self.entity.y - window_y.start
+            if not (0 <= x < distance.shape[0] and 0 <= y < distance.shape[1]) or distance[x, y] == UNREACHABLE:
+                raise exceptions.Impossible("There is nothing left to explore.")
+
+            path = [
+                (x + window_x.start, y + window_y.start)
+                for x, y in tcod.path.hillclimb2d(distance, (x, y), True, True)[1:].tolist()
+            ]
+            if not path:
+                return
+            target = path[-1]
+            for x, y in path:
+                yield MovementAction(self.entity, x - self.entity.x, y - self.entity.y)
+                # 走到物品上时停下，方便拾取
+                if any((item.x, item.y) == (self.entity.x, self.entity.y) for item in game_map.items):
+                    return
+                # 沿途发现新区域时不必重算距离图，只有终点不再是探索边界时才换一个目标
+                if not game_map.is_frontier(*target):
+                    break
@@ -0,0 +1,111 @@
+"""预先烘焙的资源缓存。
+
+缩放后的背景图被保存为原始的 NumPy .npy 文件，运行时用 `np.load(mmap_mode="r")`
+直接映射，不再解码 PNG。每个缓存文件旁边有一个 .stamp 文件，记录源文件的修改时间、大小和 SHA-256；
+缓存缺失或过期时回退到解码 PNG，并尽量顺便重新写入缓存。
+
+字体图集不做缓存：libtcod 解码这张 8 KB 的 PNG 只需约 0.5 ms，
+逐个 set_tile 从缓存重建图集反而更慢。
+
+打包前先烘焙一次，缓存会随 assets 目录一起打包：
+    python asset_cache.py
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+import game_config
+from loadImage import load_and_resize_image
+
+CACHE_DIR = os.path.join("assets", "cache")
+
+MENU_BACKGROUND = "assets/menu_background.png"
+BIRTHDAY_BACKGROUND = "assets/birthday.png"
+
+# 同一进程内已加载的背景图，菜单每帧都要绘制背景
+_backgrounds: Dict[Tuple[str, int, int], np.ndarray] = {}
+
+
+def background_size() -> Tuple[int, int]:
+    """背景图用 draw_semigraphics 绘制，每个格子对应 2x2 个像素。"""
+    return game_config.screen_width * 2, game_config.screen_height * 2
+
+
+def cache_path(source: str, suffix: str) -> str:
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, f"{stem}_{suffix}.npy")
+
+
+def _digest(source: str) -> str:
+    with open(source, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def is_fresh(source: str, cached: str) -> bool:
+    """缓存是否存在且与源文件一致。修改时间不同时（例如重新检出）再比较内容的哈希。"""
+    try:
+        with open(cached + ".stamp", encoding="utf-8") as f:
+            mtime_ns, size, digest = f.read().split()
+        stat = os.stat(source)
+    except (OSError, ValueError):
+        return False
+    if not os.path.exists(cached) or stat.st_size != int(size):
+        return False
+    if stat.st_mtime_ns == int(mtime_ns):
+        return True
+    if _digest(source) != digest:
+        return False
+    # 内容没变，记下新的修改时间，下次不必再计算哈希
+    try:
+        with open(cached + ".stamp", "w", encoding="utf-8") as f:
+            f.write(f"{stat.st_mtime_ns} {size} {digest}\n")
+    except OSError:
+        pass
+    return True
+
+
+def write_cache(source: str, cached: str, array: np.ndarray) -> None:
+    """写入缓存；资源目录只读时静默放弃。"""
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        stat = os.stat(source)
+        temp = cached + ".tmp"
+        with open(temp, "wb") as f:
+            np.save(f, array)
+        os.replace(temp, cached)
+        with open(cached + ".stamp", "w", encoding="utf-8") as f:
+            f.write(f"{stat.st_mtime_ns} {stat.st_size} {_digest(source)}\n")
+    except OSError:
+        pass
+
+
+def load_background(path: str, width: Optional[int] = None, height: Optional[int] = None) -> np.ndarray:
+    """返回缩放到 `width` x `height` 的 RGB 图片，默认铺满整个屏幕。"""
+    if width is None or height is None:
+        width, height = background_size()
+    key = path, width, height
+    if key not in _backgrounds:
+        cached = cache_path(path, f"{width}x{height}")
+        if is_fresh(path, cached):
+            _backgrounds[key] = np.load(cached, mmap_mode="r")
+        else:
+            _backgrounds[key] = load_and_resize_image(path, width, height)
+            write_cache(path, cached, _backgrounds[key])
+    return _backgrounds[key]
+
+
+def bake() -> None:
+    """重新生成所有缓存文件。"""
+    for path in (MENU_BACKGROUND, BIRTHDAY_BACKGROUND):
+        width, height = background_size()
+        cached = cache_path(path, f"{width}x{height}")
+        write_cache(path, cached, load_and_resize_image(path, width, height))
+        print(f"Baked {path} -> {cached}")
+
+
+if __name__ == "__main__":
+    bake()
@@ -0,0 +1,307 @@
+"""热点路径的基准测试，不需要显示窗口。
+
+用法：
+    python benchmarks/run.py                         # 运行全部基准并打印结果
+    python benchmarks/run.py -o results.json         # 同时写入 JSON
+    python benchmarks/run.py -k enemy_turns          # 只运行名字包含 enemy_turns 的基准
+    python benchmarks/run.py --compare baseline.json # 与之前的结果比较
+
+每个基准先执行一次准备函数，再用 timeit 反复计时被测函数，记录每次调用的最短和平均耗时。
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+import tcod  # noqa: E402
+
+import entity_factories  # noqa: E402
+import game_config  # noqa: E402
+import setup_game  # noqa: E402
+import tile_types  # noqa: E402
+from engine import Engine  # noqa: E402
+from game_map import GameMap  # noqa: E402
+from message_log import MessageLog  # noqa: E402
+from procgen import generate_bsp_dungeon, generate_caves, generate_dungeon  # noqa: E402
+
+SEED = 1234
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # 准备函数返回被测函数；准备时间不计入结果
+    setup: Callable[[], Callable[[], Any]]
+
+
+def quiet() -> contextlib.redirect_stdout:
+    """屏蔽地图生成时打印的信息。"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def new_engine() -> Engine:
+    random.seed(SEED)
+    with quiet():
+        engine = setup_game.new_game()
+    # 玩家不会死亡，保证多次计时的条件一致
+    engine.player.fighter.max_hp = engine.player.fighter.hp = 10 ** 9
+    return engine
+
+
+def storage_name(name: str, storage: str) -> str:
+    """非默认存储方式的基准在名字的方括号内加上存储方式。"""
+    return name if storage == "dense" else f"{name[:-1]},{storage}]"
+
+
+def use_storage(storage: str, directory: str) -> None:
+    """memmap 存储的地图文件写到临时目录中。"""
+    if storage == "memmap":
+        game_config.map_storage_dir = os.path.join(directory, "maps")
+
+
+def build_arena(monsters: int, width: int = 200, height: int = 100, storage: str = "dense") -> Engine:
+    """创建一个开阔的地图，玩家位于中心，周围随机分布 `monsters` 个兽人。"""
+    engine = new_engine()
+    game_map = GameMap(engine, width, height, entities=[engine.player], storage=storage)
+    game_map.tiles[1:-1, 1:-1] = tile_types.floor
+    game_map.mark_terrain_changed()
+    engine.game_map = game_map
+    engine.player.place(width // 2, height // 2, game_map)
+
+    rng = random.Random(SEED)
+    cells = [(x, y) for x in range(1, width - 1) for y in range(1, height - 1) if (x, y) != (width // 2, height // 2)]
+    for x, y in rng.sample(cells, monsters):
+        entity_factories.orc.spawn(game_map, x, y)
+
+    engine.update_fov()
+    return engine
+
+
+def bench_generate_dungeon(width: int, height: int, max_rooms: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        engine = new_engine()
+
+        def run() -> None:
+            with quiet():
+                generate_dungeon(
+                    max_rooms=max_rooms,
+                    room_min_size=game_config.room_min_size,
+                    room_max_size=game_config.room_max_size,
+                    map_width=width,
+                    map_height=height,
+                    engine=engine,
+                )
+        return run
+    return Benchmark(f"generate_dungeon[{width}x{height},{max_rooms}rooms]", setup)
+
+
+def bench_generate_bsp_dungeon(width: int, height: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        engine = new_engine()
+
+        def run() -> None:
+            with quiet():
+                generate_bsp_dungeon(
+                    room_min_size=game_config.room_min_size,
+                    room_max_size=game_config.room_max_size,
+                    map_width=width,
+                    map_height=height,
+                    engine=engine,
+                )
+        return run
+    return Benchmark(f"generate_bsp_dungeon[{width}x{height}]", setup)
+
+
+def bench_generate_caves(width: int, height: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        engine = new_engine()
+
+        def run() -> None:
+            with quiet():
+                generate_caves(map_width=width, map_height=height, engine=engine)
+        return run
+    return Benchmark(f"generate_caves[{width}x{height}]", setup)
+
+
+def bench_update_fov(monsters: int, storage: str = "dense") -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        return build_arena(monsters, storage=storage).update_fov
+    return Benchmark(storage_name(f"update_fov[200x100,{monsters}monsters]", storage), setup)
+
+
+def bench_get_path_to(monsters: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        engine = build_arena(monsters)
+        orc = next(actor for actor in engine.game_map.actors if actor is not engine.player)
+        return lambda: orc.ai.get_path_to(engine.player.x, engine.player.y)
+    return Benchmark(f"get_path_to[{monsters}monsters]", setup)
+
+
+def bench_enemy_turns(monsters: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        return build_arena(monsters).handle_enemy_turns
+    return Benchmark(f"handle_enemy_turns[{monsters}monsters]", setup)
+
+
+def bench_render_map(monsters: int, width: int = 200, height: int = 100, storage: str = "dense") -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        engine = build_arena(monsters, width, height, storage)
+        engine.game_map.explored[:] = True
+        engine.game_map.mark_explored_changed()
+        console = tcod.console.Console(game_config.screen_width, game_config.screen_height, order="F")
+        return lambda: engine.game_map.render(console)
+    name = f"GameMap.render[{monsters}monsters]"
+    if (width, height) != (200, 100):
+        name = f"GameMap.render[{width}x{height},{monsters}monsters]"
+    return Benchmark(storage_name(name, storage), setup)
+
+
+def bench_render_messages(count: int) -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        log = MessageLog()
+        for i in range(count):
+            log.add_message(f"The orc {i} attacks the player for {i % 7} hit points.")
+        console = tcod.console.Console(game_config.screen_width, game_config.screen_height, order="F")
+        return lambda: log.render_messages(console, 0, 0, 60, game_config.log_height, log.messages)
+    return Benchmark(f"MessageLog.render_messages[{count}messages]", setup)
+
+
+def bench_save(monsters: int, directory: str, size: int = 0, storage: str = "dense") -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        use_storage(storage, directory)
+        engine = build_arena(monsters, size, size, storage) if size else build_arena(monsters)
+        filename = os.path.join(directory, f"save_{monsters}.sav")
+        return lambda: engine.save_as(filename)
+    name = f"Engine.save_as[{size}x{size},{monsters}monsters]" if size else f"Engine.save_as[{monsters}monsters]"
+    return Benchmark(storage_name(name, storage), setup)
+
+
+def bench_load(monsters: int, directory: str, size: int = 0, storage: str = "dense") -> Benchmark:
+    def setup() -> Callable[[], Any]:
+        use_storage(storage, directory)
+        engine = build_arena(monsters, size, size, storage) if size else build_arena(monsters)
+        filename = os.path.join(directory, f"load_{monsters}.sav")
+        engine.save_as(filename)
+
+        def run() -> None:
+            with quiet():
+                setup_game.load_game(filename)
+        return run
+    name = f"load_game[{size}x{size},{monsters}monsters]" if size else f"load_game[{monsters}monsters]"
+    return Benchmark(storage_name(name, storage), setup)
+
+
+def all_benchmarks(directory: str) -> List[Benchmark]:
+    monster_counts = (10, 100, 1000, 10000)
+    return [
+        bench_generate_dungeon(80, 45, 10),
+        bench_generate_dungeon(120, 67, 20),
+        bench_generate_dungeon(240, 135, 60),
+        bench_generate_dungeon(480, 270, 200),
+        bench_generate_bsp_dungeon(120, 67),
+        bench_generate_bsp_dungeon(480, 270),
+        bench_generate_bsp_dungeon(1000, 1000),
+        bench_generate_caves(120, 67),
+        bench_generate_caves(1000, 1000),
+        bench_update_fov(100),
+        bench_update_fov(100, "chunked"),
+        *(bench_get_path_to(n) for n in monster_counts),
+        *(bench_enemy_turns(n) for n in monster_counts),
+        bench_render_map(100),
+        bench_render_map(10000),
+        bench_render_map(10000, 1000, 1000),
+        bench_render_map(10000, 1000, 1000, "chunked"),
+        bench_render_messages(10),
+        bench_render_messages(10000),
+        bench_save(100, directory),
+        bench_save(10000, directory),
+        bench_load(100, directory),
+        bench_load(10000, directory),
+        bench_save(100, directory, 1000),
+        bench_save(100, directory, 1000, "memmap"),
+        bench_load(100, directory, 1000),
+        bench_load(100, directory, 1000, "memmap"),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int, min_time: float) -> Dict[str, float]:
+    func = benchmark.setup()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {"min": min(times), "mean": float(np.mean(times)), "number": number, "repeat": repeat}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="approximate seconds per timing repeat")
+    args = parser.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for benchmark in all_benchmarks(directory):
+            if args.filter not in benchmark.name:
+                continue
+            result = results[benchmark.name] = measure(benchmark, args.repeat, args.min_time)
+            line = f"{benchmark.name:<48} {format_seconds(result['min']):>12}"
+            if benchmark.name in baseline:
+                line += f"  x{result['min'] / baseline[benchmark.name]['min']:.2f} vs baseline"
+            print(line, flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "revision": git_revision(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "tcod": tcod.__version__,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""比较不同存档压缩算法和等级的体积与耗时。
+
+用法：python benchmarks/save_codecs.py [--floors N] [--repeat N]
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import save_format  # noqa: E402
+import setup_game  # noqa: E402
+
+
+def build_engine(floors: int):
+    """创建一个新游戏并向下走若干层，使存档接近真实大小。"""
+    engine = setup_game.new_game()
+    for _ in range(floors - 1):
+        engine.game_world.generate_floor()
+        engine.update_fov()
+    for i in range(500):
+        engine.message_log.add_message(f"Benchmark message {i}")
+    return engine
+
+
+def best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--floors", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = build_engine(args.floors)
+    payload_size = len(pickle.dumps(engine, protocol=pickle.HIGHEST_PROTOCOL))
+    print(f"Pickled engine: {payload_size} bytes")
+    print(f"{'codec':>6} {'level':>5} {'size':>10} {'ratio':>6} {'save ms':>9} {'load ms':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bench.sav")
+        for name, codec in save_format.CODECS.items():
+            for level in codec.levels:
+                save_time = best_of(args.repeat, lambda: save_format.write_save(filename, engine, name, level))
+                size = os.path.getsize(filename)
+                load_time = best_of(args.repeat, lambda: save_format.SaveLoader(filename, verbose=False).load())
+                print(
+                    f"{name:>6} {level:>5} {size:>10} {payload_size / size:>6.1f}"
+                    f" {save_time * 1000:>9.1f} {load_time * 1000:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
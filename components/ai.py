@@ -7,29 +7,48 @@ import numpy as np  # type: ignore
 import tcod
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+import tracing
 
 
 if TYPE_CHECKING:
     from entity import Actor
 
+# 分块和 memmap 存储时，寻路窗口在起点和目标的外接矩形四周多留出的格数
+PATH_MARGIN = 16
+
 class BaseAI(Action):
     entity: Actor
 
     def perform(self) -> None:
         raise NotImplementedError()
 
+    @tracing.traced("BaseAI.get_path_to")
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """计算并返回到目标位置的路径.
 
         如果没有有效路径，则返回空列表。
+        普通数组的地图在整张地图上寻路；分块和 memmap 存储的地图先在包含起点和目标、
+        四周留出 PATH_MARGIN 格的窗口内寻路，窗口内没有路径时再在整张地图上寻路。
         """
-        # 复制可行走的数组。
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
+        game_map = self.entity.gamemap
+        full_map = slice(0, game_map.width), slice(0, game_map.height)
+        if game_map.storage == "dense":
+            return self.get_path_in(full_map, dest_x, dest_y)
+        window = game_map.window_around(self.entity.x, self.entity.y, dest_x, dest_y, PATH_MARGIN)
+        return self.get_path_in(window, dest_x, dest_y) or self.get_path_in(full_map, dest_x, dest_y)
+
+    def get_path_in(self, window: Tuple[slice, slice], dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
+        """只在 `window` 窗口内寻路，返回地图坐标的路径。"""
+        # 复制窗口内可行走的数组。
+        game_map = self.entity.gamemap
+        x0, y0 = window[0].start, window[1].start
+        cost = np.array(game_map.tiles["walkable"][window], dtype=np.int8)
+
+        for entity in game_map.entities:
+            x, y = entity.x - x0, entity.y - y0
             # 检查实体是否阻挡移动并且成本不为零（阻挡）。
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                cost[entity.x, entity.y] += 10
+            if entity.blocks_movement and 0 <= x < cost.shape[0] and 0 <= y < cost.shape[1] and cost[x, y]:
+                cost[x, y] += 10
 
         # 从成本数组创建一个图，并将其传递给新的路径查找器。
         # 表示上下左右移动的成本为2
@@ -37,13 +56,13 @@ class BaseAI(Action):
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
         pathfinder = tcod.path.Pathfinder(graph)
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # 起始位置。
+        pathfinder.add_root((self.entity.x - x0, self.entity.y - y0))  # 起始位置。
 
         # 计算到目标位置的路径并删除起始点。
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to((dest_x - x0, dest_y - y0))[1:].tolist()
 
-        # 从 List[List[int]] 转换为 List[Tuple[int, int]]。
-        return [(index[0], index[1]) for index in path]
+        # 从 List[List[int]] 转换为 List[Tuple[int, int]]，并换回地图坐标。
+        return [(index[0] + x0, index[1] + y0) for index in path]
     
 class HostileEnemy(BaseAI):
     def __init__(self, entity: Actor):
@@ -6,16 +6,16 @@ import components.ai
 import components.inventory
 from components.base_component import BaseComponent
 from exceptions import Impossible
-from input_handlers import ActionOrHandler,AreaRangedAttackHandler, SingleRangedAttackHandler
 
 if TYPE_CHECKING:
     from entity import Actor, Item
+    from input_handlers import ActionOrHandler
 
 
 class Consumable(BaseComponent):
     parent: "Item"
 
-    def get_action(self, consumer: "Actor") -> Optional[ActionOrHandler]:
+    def get_action(self, consumer: "Actor") -> Optional["ActionOrHandler"]:
         """尝试返回此物品的动作。"""
         return actions.ItemAction(consumer, self.parent)
 
@@ -120,18 +120,16 @@ class LightningDamageConsumable(Consumable):
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
-
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:     
-                    target = actor
-                    closest_distance = distance
-
-        if target:
+        # 射程是 maximum_range + 1（不含），查询结果包含边界上的角色，需要再排除
+        reach = self.maximum_range + 1.0
+        targets = [
+            actor
+            for actor in self.engine.game_map.visible_actors_near(consumer.x, consumer.y, reach, exclude=consumer)
+            if consumer.distance(actor.x, actor.y) < reach
+        ]
+
+        if targets:
+            target = targets[0]
             self.engine.message_log.add_message(
                 f"A lighting bolt strikes the {target.name} with a loud thunder, for {self.damage} damage!"
             )
@@ -145,8 +143,11 @@ class ConfusionConsumable(Consumable):
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
     
-    def get_action(self, consumer: "Actor") -> Optional[ActionOrHandler]:
+    def get_action(self, consumer: "Actor") -> Optional["ActionOrHandler"]:
         """请求目标位置"""
+        # 界面模块在需要选择目标时才导入，避免组件在加载时依赖整个界面层
+        from input_handlers import SingleRangedAttackHandler
+
         self.engine.message_log.add_message(
             "Select a target location.", color.needs_target
         )
@@ -183,7 +184,9 @@ class FireballDamageConsumable(Consumable):
         self.damage = damage
         self.radius = radius
 
-    def get_action(self, consumer: "Actor") -> Optional[ActionOrHandler]:
+    def get_action(self, consumer: "Actor") -> Optional["ActionOrHandler"]:
+        from input_handlers import AreaRangedAttackHandler
+
         self.engine.message_log.add_message(
             "Select a target location.", color.needs_target
         )
@@ -200,18 +203,16 @@ class FireballDamageConsumable(Consumable):
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You cannot target an area that you cannot see.")
         
-        targets_hit = False
+        targets = self.engine.game_map.actors_in_radius(*target_xy, self.radius)
 
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
-
-        if not targets_hit:
+        if not targets:
             raise Impossible("There are no targets in the radius.")
+
+        for actor in targets:
+            self.engine.message_log.add_message(
+                f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
+            )
+            actor.fighter.take_damage(self.damage)
         
         self.consume()
             
\ No newline at end of file
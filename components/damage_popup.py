@@ -1,58 +1,84 @@
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import heapq
 import tcod
 import time
 
+if TYPE_CHECKING:
+    from game_map import Viewport
+
 class DamagePopup:
-    def __init__(self, x: int, y: int, amount: int):
+    """同一格子上累计的伤害数值。"""
+
+    duration = 0.2  # 显示0.2秒
+
+    def __init__(self, x: int, y: int, amount: int, now: float):
         self.x = x
         self.y = y
         self.amount = amount
-        self.creation_time = time.time()
-        self.duration = 0.2  # 显示0.5秒
+        self.expires_at = now + self.duration
         self.offset_y = 1    # 显示位置
 
-    def is_expired(self) -> bool:
-        return time.time() - self.creation_time > self.duration
+    def is_expired(self, now: float) -> bool:
+        return now >= self.expires_at
 
 
 
 class DamagePopupManager:
     def __init__(self):
-        self.popups: List[DamagePopup] = []
+        # 按格子聚合的伤害提示
+        self.popups: Dict[Tuple[int, int], DamagePopup] = {}
+        # (过期时间, 格子) 的最小堆；格子被刷新后旧条目会在弹出时被忽略
+        self._expiry_heap: List[Tuple[float, Tuple[int, int]]] = []
+
+    def __getstate__(self) -> dict:
+        # 单调时钟在进程之间没有意义，存档时丢弃所有提示
+        return {"popups": {}}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
 
     def add_popup(self, x: int, y: int, amount: int):
-        self.popups.append(DamagePopup(x, y, amount))
+        now = time.monotonic()
+        popup = self.popups.get((x, y))
+        if popup is None or popup.is_expired(now):
+            popup = self.popups[x, y] = DamagePopup(x, y, amount, now)
+        else:
+            popup.amount += amount
+            popup.expires_at = now + popup.duration
+        heapq.heappush(self._expiry_heap, (popup.expires_at, (x, y)))
 
-    def update(self):
+    def update(self, now: Optional[float] = None):
         # 移除过期的提示
-        self.popups = [popup for popup in self.popups if not popup.is_expired()]
-    
+        if now is None:
+            now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, tile = heapq.heappop(heap)
+            popup = self.popups.get(tile)
+            if popup is not None and popup.is_expired(now):
+                del self.popups[tile]
 
     def get_all_amounts(self, x, y):
-        amounts = 0
-        for popup in self.popups:
-            if popup.x == x and popup.y == y:
-                amounts += popup.amount
-        return amounts
+        popup = self.popups.get((x, y))
+        return popup.amount if popup else 0
 
-    def render(self, console: tcod.console.Console):
+    def render(self, console: tcod.console.Console, view: "Viewport"):
         self.update()
 
-        for popup in self.popups:
-            # 计算实际显示位置
-            if popup.y > console.height // 2:
-                display_y = max(int(popup.y - popup.offset_y), 0)
+        for popup in self.popups.values():
+            if not view.contains(popup.x, popup.y):
+                continue
+            # 计算实际显示位置（屏幕坐标）
+            x, y = view.to_screen(popup.x, popup.y)
+            if y > view.height // 2:
+                display_y = max(int(y - popup.offset_y), 0)
             else:
-                display_y = min(int(popup.y + popup.offset_y), console.height - 1)
-
-            allAmounts = self.get_all_amounts(popup.x, popup.y)
+                display_y = min(int(y + popup.offset_y), view.height - 1)
 
             # 显示伤害数值
             console.print(
-                x=popup.x,
+                x=x,
                 y=display_y,
-                string=f"{allAmounts}",
+                string=f"{popup.amount}",
                 fg=tcod.red
             )
-            
-            
\ No newline at end of file
@@ -3,10 +3,10 @@ from typing import Optional, TYPE_CHECKING
 import actions
 from components.base_component import BaseComponent
 from equipment_types import EquipmentType
-from input_handlers import ActionOrHandler
 
 if TYPE_CHECKING:
     from entity import Actor, Item
+    from input_handlers import ActionOrHandler
 
 
 class Equippable(BaseComponent):
@@ -27,7 +27,7 @@ class Equippable(BaseComponent):
         self.power_bonus = power_bonus
         self.defense_bonus = defense_bonus
 
-    def get_action(self, consumer: "Actor") -> Optional[ActionOrHandler]:
+    def get_action(self, consumer: "Actor") -> Optional["ActionOrHandler"]:
         return actions.EquipAction(consumer, self.parent)
 
 
@@ -71,7 +71,8 @@ class Fighter(BaseComponent):
         self.parent.blocks_movement = False
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
-        self.parent.render_order = RenderOrder.CORPSE
+        self.gamemap.entities.set_render_order(self.parent, RenderOrder.CORPSE)
+        self.gamemap.invalidate_actor_index()
 
         self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -1,4 +1,5 @@
-from typing import TYPE_CHECKING
+import random
+from typing import Optional, TYPE_CHECKING
 
 from tcod.console import Console
 from tcod.map import compute_fov
@@ -9,8 +10,10 @@ from message_log import MessageLog
 
 import exceptions
 
-import lzma
-import pickle
+import map_storage
+import save_format
+import tracing
+from profiler import frame_profiler
 
 from components.damage_popup import DamagePopupManager
 
@@ -18,6 +21,7 @@ from components.damage_popup import DamagePopupManager
 if TYPE_CHECKING:
     from entity import Actor
     from game_map import GameMap, GameWorld
+    from replay import Replay
 
 class Engine:
 
@@ -29,28 +33,54 @@ class Engine:
         self.mouse_location = (0, 0)
         self.player = player
         self.damage_popup_manager = DamagePopupManager()
+        # 本局的录像，由 setup_game.new_game 创建
+        self.replay: Optional["Replay"] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # 随机数状态随存档保存，继续游戏后的结果仍然可以由录像重现
+        state["rng_state"] = random.getstate()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        rng_state = state.pop("rng_state", None)
+        if rng_state is not None:
+            random.setstate(rng_state)
+        self.__dict__.update(state)
+        self.__dict__.setdefault("replay", None)  # 旧存档中没有录像
 
     def handle_enemy_turns(self) -> None:
         # 遍历地图中的所有实体，除了玩家
-        for entity in set(self.game_map.actors) - {self.player}:
-           if entity.ai:
-                try:
-                    entity.ai.perform()
-                except exceptions.Impossible:
-                    pass  # Ignore impossible action exceptions from AI.
+        with frame_profiler.phase("handle_enemy_turns"):
+            # 按位置排序，行动顺序不依赖集合的迭代顺序，录像才能重现
+            enemies = sorted(
+                (actor for actor in self.game_map.actors if actor is not self.player),
+                key=lambda actor: (actor.y, actor.x),
+            )
+            for entity in enemies:
+               if entity.ai:
+                    try:
+                        with tracing.span("BaseAI.perform", entity=entity.name, ai=type(entity.ai).__name__):
+                            entity.ai.perform()
+                    except exceptions.Impossible:
+                        pass  # Ignore impossible action exceptions from AI.
 
     def update_fov(self) -> None:
         """重计算玩家视野范围内的可见区域。"""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=game_config.fov_radius,
-        )
-        # 如果一个方块在 "visible" 数组中，则它应该被添加到 "explored" 数组中。
-        self.game_map.explored |= self.game_map.visible
+        with frame_profiler.phase("update_fov"):
+            # 如果一个方块在 "visible" 数组中，则它应该被添加到 "explored" 数组中。
+            # 只在视野半径能覆盖的窗口内计算，耗时与地图大小无关
+            x, y = self.player.x, self.player.y
+            window = self.game_map.fov_window(x, y, game_config.fov_radius)
+            self.game_map.update_visible(compute_fov(
+                self.game_map.tiles["transparent"][window],
+                (x - window[0].start, y - window[1].start),
+                radius=game_config.fov_radius,
+            ), window)
 
     def render(self, console: Console) -> None:
-        self.game_map.render(console)
+        with frame_profiler.phase("render_map"):
+            self.game_map.render(console)
 
         # render_functions.render_margin(
         #     console=console, 
@@ -58,45 +88,53 @@ class Engine:
         #     y=game_config.split_line_y,
         # )
 
-        self.message_log.render(
-            console=console, 
-            x=game_config.bar_width + game_config.x_margin, 
-            y=game_config.split_line_y + game_config.mouse_description, 
-            width=game_config.screen_width - game_config.bar_width - game_config.x_margin - game_config.tip_width - game_config.x_margin, 
-            height=game_config.log_height
-        )
-
-        render_functions.render_bar(
-            console=console,
-            current_value=self.player.fighter.hp,
-            maximum_value=self.player.fighter.max_hp,
-            total_width= game_config.bar_width,
-        )
-
-        render_functions.render_tip(
-            console=console,
-            location=(game_config.screen_width - game_config.tip_width, game_config.split_line_y + game_config.mouse_description),
-            tip="Press the 'h' for help"
-        )
-
-        render_functions.render_dungeon_level(
-            console=console,
-            dungeon_level=self.game_world.current_floor,
-            location=(0, game_config.split_line_y + game_config.mouse_description + 2),
-        )
-
-        render_functions.render_names_at_mouse_location(
-            console=console, 
-            x=game_config.bar_width + game_config.x_margin, 
-            y=game_config.split_line_y, 
-            engine=self
-        )
+        with frame_profiler.phase("render_log"):
+            self.message_log.render(
+                console=console, 
+                x=game_config.bar_width + game_config.x_margin, 
+                y=game_config.split_line_y + game_config.mouse_description, 
+                width=game_config.screen_width - game_config.bar_width - game_config.x_margin - game_config.tip_width - game_config.x_margin, 
+                height=game_config.log_height
+            )
+
+        with frame_profiler.phase("render_bars"):
+            render_functions.render_bar(
+                console=console,
+                current_value=self.player.fighter.hp,
+                maximum_value=self.player.fighter.max_hp,
+                total_width= game_config.bar_width,
+            )
+
+            render_functions.render_tip(
+                console=console,
+                location=(game_config.screen_width - game_config.tip_width, game_config.split_line_y + game_config.mouse_description),
+                tip="Press the 'h' for help"
+            )
+
+            render_functions.render_dungeon_level(
+                console=console,
+                dungeon_level=self.game_world.current_floor,
+                location=(0, game_config.split_line_y + game_config.mouse_description + 2),
+            )
+
+            render_functions.render_names_at_mouse_location(
+                console=console, 
+                x=game_config.bar_width + game_config.x_margin, 
+                y=game_config.split_line_y, 
+                engine=self
+            )
 
         # 在最后渲染伤害提示
-        self.damage_popup_manager.render(console)
+        with frame_profiler.phase("render_popups"):
+            self.damage_popup_manager.render(console, self.game_map.viewport)
+
+        # 调试用的耗时叠加层（F3 切换）
+        if frame_profiler.enabled and frame_profiler.samples:
+            render_functions.render_profiler(console, frame_profiler, location=(0, 0))
 
     def save_as(self, filename: str) -> None:
         """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)  
+        save_format.write_save(filename, self)
+        # memmap 存储时只有当前地图的文件属于这份存档，删除其余旧的地图目录
+        if self.game_map.storage_dir is not None:
+            map_storage.prune_directories(keep=[self.game_map.storage_dir])
@@ -44,6 +44,7 @@ class Entity:
             # 如果游戏地图现在没有提供，稍后会设置
             self.gamemap = parent
             parent.entities.add(self)
+            parent.invalidate_actor_index()
 
     @property
     def gamemap(self) -> "GameMap":
@@ -56,12 +57,14 @@ class Entity:
         clone.y = y
         clone.parent = gamemap
         gamemap.entities.add(clone)
+        gamemap.invalidate_actor_index()
         return clone
 
     # 移动实体
     def move(self, dx: int, dy: int) -> None:
         self.x += dx
         self.y += dy
+        self.gamemap.update_entity_position(self)
 
     def place(self, x: int, y: int, gamemap: Optional["GameMap"] = None) -> None:
         """将实体放置在新位置。处理跨游戏地图的移动。"""
@@ -71,8 +74,12 @@ class Entity:
             if hasattr(self, "parent"): 
                 if self.parent is self.gamemap: # 可能未初始化
                     self.gamemap.entities.remove(self)
+                    self.gamemap.invalidate_actor_index()
             self.parent = gamemap
             gamemap.entities.add(self)
+            gamemap.invalidate_actor_index()
+        elif hasattr(self, "parent"):
+            self.gamemap.update_entity_position(self)
 
     def distance(self, x: int, y: int) -> float:
         """返回这个实体和给定坐标之间的距离。"""
@@ -5,4 +5,7 @@ class Impossible(Exception):
     """
 
 class QuitWithoutSaving(SystemExit):
-    """用户选择退出游戏时引发的异常。"""
\ No newline at end of file
+    """用户选择退出游戏时引发的异常。"""
+
+class InvalidSaveFile(Exception):
+    """存档文件头或数据校验失败时引发的异常。"""
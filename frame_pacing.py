@@ -0,0 +1,37 @@
+"""基于单调时钟的帧调度：只睡眠本帧剩余的时间，有输入时立即唤醒。"""
+import time
+
+import tcod.event
+
+
+class FrameScheduler:
+    """按目标帧率安排每一帧的截止时间。
+
+    `target_fps` 为 0 时不做任何等待，用于基准测试。
+    如果某一帧超出了预算，下一帧从当前时间重新计时，而不是连续追赶。
+    """
+
+    def __init__(self, target_fps: int):
+        self.target_fps = target_fps
+        self.frame_time = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.deadline = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.frame_time == 0.0
+
+    def wait(self) -> None:
+        """等待到下一帧的截止时间；期间有输入事件时立即返回。"""
+        if self.unlimited:
+            return
+
+        now = time.monotonic()
+        self.deadline += self.frame_time
+        if self.deadline <= now:
+            self.deadline = now
+            return
+
+        # tcod.event.wait 在有事件到达时会提前返回；返回的事件留在队列中供下一帧处理
+        tcod.event.wait(timeout=self.deadline - now)
+        # 被输入提前唤醒时，从唤醒时刻开始下一帧
+        self.deadline = min(self.deadline, time.monotonic())
@@ -2,6 +2,14 @@
 screen_width = 120
 screen_height = 75
 
+# 目标帧率，0 表示不限制（用于基准测试）
+target_fps = 60
+# 垂直同步；帧率已经由 FrameScheduler 控制，默认关闭以免与其叠加等待
+vsync = False
+# 奔跑、前往、自动探索等多回合动作每帧最多执行的回合数，其余回合留到之后的帧，中间照常渲染；
+# 0 或负数表示不限，整个动作在一帧内执行完，只渲染最终状态
+multi_turn_turns_per_frame = 8
+
 # 鼠标描述
 mouse_description = 1
 
@@ -15,6 +23,11 @@ room_min_size = 6
 # 最大房间数
 max_rooms = 2
 
+# 地图生成器：rooms（房间和走廊）/ bsp（二叉空间分割）/ caves（元胞自动机洞穴）
+dungeon_generator = "rooms"
+# 按楼层指定生成器，未列出的楼层使用 dungeon_generator，例如 {3: "caves"}
+floor_generators = {}
+
 # 菜单宽度
 menu_width = 36
 
@@ -32,3 +45,23 @@ x_margin = 4
 
 # 分割线位置
 split_line_y = screen_height - log_height - mouse_description
+
+# 地图大小，可以大于屏幕
+map_width = screen_width
+map_height = split_line_y
+# 镜头大小：屏幕上用于显示地图的区域，镜头跟随玩家移动
+view_width = screen_width
+view_height = split_line_y
+
+# 地图数组的存储方式：dense（完整数组）/ chunked（按块按需分配，适合非常大的稀疏地图）
+# / memmap（数组保存在 map_storage_dir 下的文件中，按需分页读入，适合最大的地图）
+map_storage = "dense"
+# chunked 存储的块大小，memmap 存储逐段处理整张地图时每段的行数
+map_chunk_size = 64
+# memmap 存储的地图文件目录，每层地图一个子目录，与 savegame.sav 一起构成存档
+map_storage_dir = "savegame.maps"
+
+# 存档压缩算法：none / lzma / zlib / gzip / bz2
+save_codec = "zlib"
+# 压缩等级（lzma 为 preset 0-9，zlib/gzip 为 0-9，bz2 为 1-9），None 表示使用默认等级
+save_level = None
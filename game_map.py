@@ -1,34 +1,236 @@
+import os
+
 import numpy as np  # type: ignore
+import tcod
 from tcod.console import Console
 
 from entity import Actor, Item
+import game_config
+import map_storage
+import memory_diagnostics
+from render_order import RenderOrder
 import tile_types
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
    from engine import Engine
    from entity import Entity
 
+# explore_distance 中无法到达探索边界的格子
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def _enclosing(window: Tuple[slice, slice], other: Optional[Tuple[slice, slice]]) -> Tuple[slice, slice]:
+    """同时包含两个窗口的最小窗口；`other` 为 None 时返回 `window`。"""
+    if other is None:
+        return window
+    return (
+        slice(min(window[0].start, other[0].start), max(window[0].stop, other[0].stop)),
+        slice(min(window[1].start, other[1].start), max(window[1].stop, other[1].stop)),
+    )
+
+
+class EntitySet(set):
+    """按 RenderOrder 分桶的实体集合。
+
+    每一层缓存坐标、字符和颜色数组，渲染时可以对整层做一次批量赋值。
+    分桶和数组都是按需构建的，不会被存档。
+    """
+
+    def __init__(self, entities: Iterable["Entity"] = ()):
+        super().__init__(entities)
+        self._layers: Optional[Dict[RenderOrder, Set["Entity"]]] = None
+        self._arrays: Dict[RenderOrder, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, Dict["Entity", int]]] = {}
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    @property
+    def layers(self) -> Dict[RenderOrder, Set["Entity"]]:
+        if self._layers is None:
+            self._layers = {order: set() for order in RenderOrder}
+            for entity in self:
+                self._layers[entity.render_order].add(entity)
+            self._arrays.clear()
+        return self._layers
+
+    def add(self, entity: "Entity") -> None:
+        super().add(entity)
+        if self._layers is not None:
+            self._layers[entity.render_order].add(entity)
+            self._arrays.pop(entity.render_order, None)
+
+    def remove(self, entity: "Entity") -> None:
+        super().remove(entity)
+        if self._layers is not None:
+            self._layers[entity.render_order].discard(entity)
+            self._arrays.pop(entity.render_order, None)
+
+    def discard(self, entity: "Entity") -> None:
+        if entity in self:
+            self.remove(entity)
+
+    def clear(self) -> None:
+        super().clear()
+        self._layers = None
+        self._arrays.clear()
+
+    def set_render_order(self, entity: "Entity", render_order: RenderOrder) -> None:
+        """修改实体的渲染层级，并把它移到对应的桶中。"""
+        if entity in self and self._layers is not None:
+            self._layers[entity.render_order].discard(entity)
+            self._arrays.pop(entity.render_order, None)
+            self._layers[render_order].add(entity)
+            self._arrays.pop(render_order, None)
+        entity.render_order = render_order
+
+    def layer_arrays(self, render_order: RenderOrder) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """返回某一层所有实体的 x、y 坐标、字符码点和前景色数组。"""
+        arrays = self._arrays.get(render_order)
+        if arrays is None:
+            layer = list(self.layers[render_order])
+            count = len(layer)
+            xs = np.fromiter((entity.x for entity in layer), dtype=np.intp, count=count)
+            ys = np.fromiter((entity.y for entity in layer), dtype=np.intp, count=count)
+            chars = np.fromiter((ord(entity.char) for entity in layer), dtype=np.int32, count=count)
+            colors = np.array([entity.color for entity in layer], dtype=np.uint8).reshape(count, 3)
+            arrays = self._arrays[render_order] = xs, ys, chars, colors, {entity: i for i, entity in enumerate(layer)}
+        return arrays[:4]
+
+    def update_position(self, entity: "Entity") -> None:
+        """实体移动后调用，就地更新所在层的坐标数组。"""
+        arrays = self._arrays.get(entity.render_order)
+        if arrays is None:
+            return
+        xs, ys, _, _, slots = arrays
+        slot = slots.get(entity)
+        if slot is not None:
+            xs[slot] = entity.x
+            ys[slot] = entity.y
+
+
+class Viewport(NamedTuple):
+    """地图上显示在屏幕左上角的矩形区域，(x, y) 是它左上角的地图坐标。"""
+    x: int
+    y: int
+    width: int
+    height: int
+
+    @property
+    def slices(self) -> Tuple[slice, slice]:
+        """视口在地图数组中的切片。"""
+        return slice(self.x, self.x + self.width), slice(self.y, self.y + self.height)
+
+    def contains(self, x: int, y: int) -> bool:
+        """地图坐标 (x, y) 是否在视口内。"""
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+    def to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        return x - self.x, y - self.y
+
+    def to_map(self, x: int, y: int) -> Tuple[int, int]:
+        return x + self.x, y + self.y
+
+    def clip(self, window: Tuple[slice, slice]) -> Optional[Tuple[Tuple[slice, slice], Tuple[slice, slice]]]:
+        """把地图上的窗口裁剪到视口内。
+
+        返回 (屏幕上的切片, 相对于窗口左上角的切片)；窗口完全在视口外时返回 None。
+        """
+        x0, x1 = max(window[0].start, self.x), min(window[0].stop, self.x + self.width)
+        y0, y1 = max(window[1].start, self.y), min(window[1].stop, self.y + self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        screen = slice(x0 - self.x, x1 - self.x), slice(y0 - self.y, y1 - self.y)
+        local = (
+            slice(x0 - window[0].start, x1 - window[0].start),
+            slice(y0 - window[1].start, y1 - window[1].start),
+        )
+        return screen, local
+
+
 class GameMap:
     def __init__(
-        self, engine: "Engine", width: int, height: int, entities: Iterable["Entity"] = ()
+        self,
+        engine: "Engine",
+        width: int,
+        height: int,
+        entities: Iterable["Entity"] = (),
+        storage: Optional[str] = None,
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        # 数组的存储方式，见 map_storage；默认取 game_config.map_storage
+        self.storage = storage or game_config.map_storage
+        # memmap 存储时这层地图的文件所在目录
+        self.storage_dir = map_storage.new_directory() if self.storage == "memmap" else None
+        self.tiles = self._new_array("tiles", tile_types.wall)
 
-        self.entities = set(entities)
+        self.entities = EntitySet(entities)
 
-        self.visible = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # 玩家目前视野范围内可见的地图格子
-        self.explored = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # 玩家之前探索过的地图格子
+        self.visible = self._new_array("visible", np.bool_(False))  # 玩家目前视野范围内可见的地图格子
+        self.explored = self._new_array("explored", np.bool_(False))  # 玩家之前探索过的地图格子
+        # visible 中可能为 True 的窗口，None 表示没有可见格子
+        self._visible_window: Optional[Tuple[slice, slice]] = None
+        # explored 中所有 True 格子的外接矩形，None 表示还没有探索任何格子。
+        # 由 update_visible 维护，其他地方修改 explored 后需要调用 mark_explored_changed
+        self._explored_bounds: Optional[Tuple[slice, slice]] = None
 
         self.downstairs_location = (0, 0)
+
+        # 存活角色的坐标索引，按需构建，角色增减或死亡时失效
+        self._actor_index: Optional[Tuple[List[Actor], np.ndarray, np.ndarray, Dict[Actor, int]]] = None
+
+        # 根据 visible/explored 合成好的地形图层，按需构建，视野变化时只修补变化的格子
+        self._tile_layer: Optional[np.ndarray] = None
+
+        # 到探索边界的距离图及其窗口，按需构建，已探索区域或地形变化时失效
+        self._explore_distance: Optional[Tuple[Tuple[slice, slice], np.ndarray]] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # 缓存不需要存档
+        state["_actor_index"] = None
+        state["_tile_layer"] = None
+        state["_explore_distance"] = None
+        # memmap 数组只保存文件路径，存档时把数据刷到文件即可
+        for name in ("tiles", "visible", "explored"):
+            state[name] = map_storage.to_state(state[name])
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        for name in ("tiles", "visible", "explored"):
+            setattr(self, name, map_storage.from_state(getattr(self, name)))
+        # 旧存档中没有缓存字段
+        self.__dict__.setdefault("_actor_index", None)
+        self.__dict__.setdefault("_tile_layer", None)
+        self.__dict__.setdefault("_explore_distance", None)
+        self.__dict__.setdefault("storage", "dense")
+        self.__dict__.setdefault("_visible_window", (slice(0, self.width), slice(0, self.height)))
+        self.__dict__.setdefault("storage_dir", None)
+        if self.storage_dir is not None:
+            # memmap 文件在存档之后继续被游戏修改，存档里的窗口可能已过期，按文件内容重新计算
+            self._visible_window = map_storage.bounds(self.visible)
+            self._explored_bounds = map_storage.bounds(self.explored)
+        elif "_explored_bounds" not in self.__dict__:
+            self._explored_bounds = map_storage.bounds(self.explored)
+        if not isinstance(self.entities, EntitySet):  # 旧存档中是普通 set
+            self.entities = EntitySet(self.entities)
     
+    def _new_array(self, name: str, fill_value: np.ndarray) -> map_storage.ArrayLike:
+        """按这层地图的存储方式创建一个地图大小的数组，memmap 存储时文件名取 `name`。"""
+        path = None if self.storage_dir is None else os.path.join(self.storage_dir, f"{name}.npy")
+        return map_storage.new_array(self.storage, (self.width, self.height), fill_value, path=path)
+
+    def release_storage(self) -> None:
+        """这层地图不再使用时调用，删除 memmap 存储的文件。"""
+        if self.storage_dir is not None:
+            self.tiles = self.visible = self.explored = None  # type: ignore
+            self._tile_layer = None
+            map_storage.remove_directory(self.storage_dir)
+            self.storage_dir = None
+
     @property
     def gamemap(self) -> "GameMap":
         return self
@@ -69,27 +271,239 @@ class GameMap:
         """如果x和y在地图边界内则返回True。"""
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console) -> None:
+    @property
+    def viewport(self) -> Viewport:
+        """以玩家为中心、不超出地图边界的镜头区域，大小为 game_config.view_width x view_height。"""
+        width = min(game_config.view_width, self.width)
+        height = min(game_config.view_height, self.height)
+        player = self.engine.player
+        x = max(0, min(player.x - width // 2, self.width - width))
+        y = max(0, min(player.y - height // 2, self.height - height))
+        return Viewport(x, y, width, height)
+
+    def window_around(self, x0: int, y0: int, x1: int, y1: int, margin: int) -> Tuple[slice, slice]:
+        """包含 (x0, y0) 和 (x1, y1)、四周再留出 margin 格、裁剪到地图边界内的窗口。"""
+        return (
+            slice(max(min(x0, x1) - margin, 0), min(max(x0, x1) + margin + 1, self.width)),
+            slice(max(min(y0, y1) - margin, 0), min(max(y0, y1) + margin + 1, self.height)),
+        )
+
+    def fov_window(self, x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        """以 (x, y) 为中心、半径为 radius 的视野所能覆盖的窗口；radius 为 0 表示不限距离。"""
+        if radius <= 0:
+            return slice(0, self.width), slice(0, self.height)
+        return self.window_around(x, y, x, y, radius)
+
+    def explored_window(self) -> Optional[Tuple[slice, slice]]:
+        """已探索区域的外接矩形，四周多留一格；还没有探索任何格子时返回 None。"""
+        window = self._explored_bounds
+        if window is None:
+            return None
+        return self.window_around(window[0].start, window[1].start, window[0].stop - 1, window[1].stop - 1, 1)
+
+    def radius_mask(self, x: int, y: int, radius: int) -> Tuple[Tuple[slice, slice], np.ndarray]:
+        """返回以 (x, y) 为圆心、半径为 radius 的圆形区域。
+
+        结果是裁剪到地图边界内的窗口切片，以及该窗口内的布尔掩码。
+        """
+        x0, x1 = max(x - radius, 0), min(x + radius + 1, self.width)
+        y0, y1 = max(y - radius, 0), min(y + radius + 1, self.height)
+        xs, ys = np.ogrid[x0:x1, y0:y1]
+        mask = (xs - x) ** 2 + (ys - y) ** 2 <= radius ** 2
+        return (slice(x0, x1), slice(y0, y1)), mask
+
+    def actor_coordinates(self) -> Tuple[List[Actor], np.ndarray, np.ndarray]:
+        """返回所有存活角色，以及它们的 x、y 坐标数组。
+
+        返回的数组是内部缓存，调用者不应修改。
+        """
+        if self._actor_index is None:
+            # 按位置排序，基于索引的查询结果不依赖集合的迭代顺序
+            actors = sorted(self.actors, key=lambda actor: (actor.y, actor.x))
+            xs = np.fromiter((actor.x for actor in actors), dtype=np.intp, count=len(actors))
+            ys = np.fromiter((actor.y for actor in actors), dtype=np.intp, count=len(actors))
+            self._actor_index = actors, xs, ys, {actor: i for i, actor in enumerate(actors)}
+        actors, xs, ys, _ = self._actor_index
+        return actors, xs, ys
+
+    def invalidate_actor_index(self) -> None:
+        """角色加入、离开地图或死亡后调用，下次查询时重建坐标索引。"""
+        self._actor_index = None
+
+    def update_entity_position(self, entity: "Entity") -> None:
+        """实体移动后调用，就地更新坐标索引和渲染层数组。"""
+        self.entities.update_position(entity)
+        if self._actor_index is None:
+            return
+        _, xs, ys, slots = self._actor_index
+        slot = slots.get(entity)  # type: ignore
+        if slot is not None:
+            xs[slot] = entity.x
+            ys[slot] = entity.y
+
+    def actors_in_radius(self, x: int, y: int, radius: int) -> List[Actor]:
+        """返回距离 (x, y) 不超过 radius 的所有存活角色。"""
+        actors, xs, ys = self.actor_coordinates()
+        (window_x, window_y), mask = self.radius_mask(x, y, radius)
+
+        inside = (
+            (xs >= window_x.start) & (xs < window_x.stop)
+            & (ys >= window_y.start) & (ys < window_y.stop)
+        )
+        hit = np.zeros(len(actors), dtype=bool)
+        hit[inside] = mask[xs[inside] - window_x.start, ys[inside] - window_y.start]
+
+        return [actors[i] for i in np.flatnonzero(hit)]
+
+    def visible_actors_near(
+        self, x: int, y: int, radius: float, exclude: Optional[Actor] = None,
+    ) -> List[Actor]:
+        """返回玩家可见、距离 (x, y) 不超过 radius 的存活角色，按距离从近到远排序。
+
+        距离相同时按坐标排序，保证结果稳定。
+        """
+        actors, xs, ys = self.actor_coordinates()
+        if not actors:
+            return []
+
+        distance_sq = (xs - x) ** 2 + (ys - y) ** 2
+        indices = np.flatnonzero((distance_sq <= radius ** 2) & self.visible[xs, ys])
+        order = np.lexsort((ys[indices], xs[indices], distance_sq[indices]))
+        return [actors[i] for i in indices[order] if actors[i] is not exclude]
+
+    def mark_explored_changed(self) -> None:
+        """不经过 update_visible 直接修改 explored 之后调用，重新计算已探索区域。"""
+        self._explored_bounds = map_storage.bounds(self.explored)
+        self._tile_layer = None
+        self._explore_distance = None
+
+    def mark_terrain_changed(self) -> None:
+        """修改 tiles 之后调用，下次渲染时重新合成地形图层。"""
+        self._tile_layer = None
+        self._explore_distance = None
+
+    def update_visible(self, visible: np.ndarray, window: Tuple[slice, slice]) -> None:
+        """设置新的可见区域，把可见格子加入已探索区域，并修补缓存的地形图层。
+
+        `visible` 是 `window` 窗口内的可见性，窗口外的格子都不可见。
+        只需要读写旧的可见窗口和新窗口的外接矩形。
         """
-        渲染地图。
+        union = _enclosing(window, self._visible_window)
+        new_visible = np.zeros((union[0].stop - union[0].start, union[1].stop - union[1].start), dtype=bool, order="F")
+        new_visible[
+            window[0].start - union[0].start:window[0].stop - union[0].start,
+            window[1].start - union[1].start:window[1].stop - union[1].start,
+        ] = visible
+        self._visible_window = window
+
+        explored = self.explored[union]
+        if (new_visible & ~explored).any():
+            self._explore_distance = None
+            # 新可见区域在 union 窗口内的外接矩形，换成地图坐标后并入已探索区域
+            seen = map_storage.bounds(new_visible)
+            x0, y0 = union[0].start, union[1].start
+            seen = slice(seen[0].start + x0, seen[0].stop + x0), slice(seen[1].start + y0, seen[1].stop + y0)
+            self._explored_bounds = _enclosing(seen, self._explored_bounds)
+        changed = np.nonzero(new_visible != self.visible[union])
+        self.visible[union] = new_visible
+        self.explored[union] = explored | new_visible
+
+        if self._tile_layer is None:
+            return
+
+        # 可见性翻转的格子一定已被探索过，所以只在 light 和 dark 之间选择
+        tiles = self.tiles[union]
+        layer = self._tile_layer[union]
+        layer[changed] = np.where(
+            new_visible[changed], tiles["light"][changed], tiles["dark"][changed]
+        )
+        self._tile_layer[union] = layer
+
+    def is_frontier(self, x: int, y: int) -> bool:
+        """(x, y) 是否是探索边界：已探索的可行走格子，且与未探索的可行走格子相邻。"""
+        if not (self.tiles["walkable"][x, y] and self.explored[x, y]):
+            return False
+        window = self.window_around(x, y, x, y, 1)
+        return bool((self.tiles["walkable"][window] & ~self.explored[window]).any())
+
+    def explore_distance(self) -> Tuple[Tuple[slice, slice], np.ndarray]:
+        """
+        到最近的探索边界（与未探索的可行走格子相邻的已探索格子）的距离图。
+        所有边界格子作为起点，只计算一次多源 Dijkstra；无法到达的格子为 UNREACHABLE。
+
+        只在已探索区域的外接矩形内计算，返回该窗口和窗口内的距离图。
+        """
+        if self._explore_distance is None:
+            window = self.explored_window() or (slice(0, 0), slice(0, 0))
+            self._explore_distance = window, self._frontier_distance(window)
+        return self._explore_distance
+
+    def explore_distance_near(self, x: int, y: int, margin: int) -> Tuple[Tuple[slice, slice], np.ndarray]:
+        """只在 (x, y) 四周 margin 格的窗口内计算的 explore_distance，不缓存。
+
+        离开窗口的路径代价至少是 2 * margin，所以窗口内小于这个值的距离与整张地图上的相同。
+        """
+        window = self.window_around(x, y, x, y, margin)
+        return window, self._frontier_distance(window)
+
+    def _frontier_distance(self, window: Tuple[slice, slice]) -> np.ndarray:
+        """窗口内到探索边界的距离图，窗口外的格子视为不存在。"""
+        width, height = window[0].stop - window[0].start, window[1].stop - window[1].start
+        walkable = self.tiles["walkable"][window]
+        explored = self.explored[window]
+        known = walkable & explored
+        unknown = np.pad(walkable & ~explored, 1)
+        near_unknown = np.zeros_like(known)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                near_unknown |= unknown[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+
+        distance = np.full((width, height), UNREACHABLE, dtype=np.int32, order="F")
+        distance[known & near_unknown] = 0
+        tcod.path.dijkstra2d(distance, known.astype(np.int8), cardinal=2, diagonal=3, out=distance)
+        return distance
+
+    @property
+    def tile_layer(self) -> np.ndarray:
+        """
+        合成后的地形图层。
         如果一个方块在 "visible" 数组中，则用 "light" 颜色绘制它。
         如果它不在 "visible" 数组中，但它在 "explored" 数组中，则用 "dark" 颜色绘制它。
         否则，默认是 "SHROUD"。
         """
-        console.rgb[0:self.width, 0:self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        )
+        if self._tile_layer is None:
+            layer = self._new_array("tile_layer", tile_types.SHROUD)
+            # 未探索的部分保持 SHROUD，分块存储时不会为它们分配内存
+            for window in map_storage.windows(self.explored):
+                if not self.explored[window].any():
+                    continue
+                tiles = self.tiles[window]
+                layer[window] = np.select(
+                    condlist=[self.visible[window], self.explored[window]],
+                    choicelist=[tiles["light"], tiles["dark"]],
+                    default=tile_types.SHROUD,
+                )
+            self._tile_layer = layer
+        return self._tile_layer
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value       
-        )
+    def render(self, console: Console) -> None:
+        """渲染镜头内的地图：先贴上缓存的地形图层中对应的窗口，再绘制实体。"""
+        view = self.viewport
+        console.rgb[0:view.width, 0:view.height] = self.tile_layer[view.slices]
 
-        for entity in entities_sorted_for_rendering:
-            # 只打印在视野范围内的实体
-            if self.visible[entity.x, entity.y]:
-                console.print(x=entity.x, y=entity.y, string=entity.char, fg=entity.color)
+        # 按渲染层级从低到高，每层一次性写入所有可见实体
+        for render_order in RenderOrder:
+            xs, ys, chars, colors = self.entities.layer_arrays(render_order)
+            if not len(xs):
+                continue
+            # 只打印在镜头内且在视野范围内的实体
+            shown = np.flatnonzero(
+                (xs >= view.x) & (xs < view.x + view.width) & (ys >= view.y) & (ys < view.y + view.height)
+            )
+            shown = shown[self.visible[xs[shown], ys[shown]]]
+            screen_xs, screen_ys = xs[shown] - view.x, ys[shown] - view.y
+            console.rgb["ch"][screen_xs, screen_ys] = chars[shown]
+            console.rgb["fg"][screen_xs, screen_ys] = colors[shown]
 
 class GameWorld:
     """
@@ -120,15 +534,38 @@ class GameWorld:
         self.current_floor = current_floor
 
     def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+        from procgen import generate_bsp_dungeon, generate_caves, generate_dungeon
         # 生成新的地图
         self.current_floor += 1
+        # 旧地图的 memmap 文件可能仍被磁盘上的存档引用，由下一次存档时的 prune_directories 删除
+
+        generator = game_config.floor_generators.get(self.current_floor, game_config.dungeon_generator)
+        if generator == "rooms":
+            self.engine.game_map = generate_dungeon(
+                max_rooms=self.max_rooms,
+                room_min_size=self.room_min_size,
+                room_max_size=self.room_max_size,
+                map_width=self.map_width,
+                map_height=self.map_height,
+                engine=self.engine,
+            )
+        elif generator == "caves":
+            # 敌人和物品的组数与房间数相同，难度与房间地图相当
+            self.engine.game_map = generate_caves(
+                map_width=self.map_width,
+                map_height=self.map_height,
+                engine=self.engine,
+                areas=self.max_rooms,
+            )
+        elif generator == "bsp":
+            self.engine.game_map = generate_bsp_dungeon(
+                room_min_size=self.room_min_size,
+                room_max_size=self.room_max_size,
+                map_width=self.map_width,
+                map_height=self.map_height,
+                engine=self.engine,
+            )
+        else:
+            raise ValueError(f"Unknown dungeon generator {generator!r}.")
 
-        self.engine.game_map = generate_dungeon(
-            max_rooms=self.max_rooms,
-            room_min_size=self.room_min_size,
-            room_max_size=self.room_max_size,
-            map_width=self.map_width,
-            map_height=self.map_height,
-            engine=self.engine,
-        )
\ No newline at end of file
+        memory_diagnostics.on_floor_generated(self.engine)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
+from typing import Callable, Iterable, List, Optional, Tuple, TYPE_CHECKING, Union
 
 import tcod.event
 import tcod.console
@@ -12,14 +12,17 @@ from actions import (
     PickupAction,
     WaitAction
 )
+import asset_cache
 import color
 import exceptions
 import game_config
-from loadImage import load_and_resize_image
+import memory_diagnostics
+from profiler import frame_profiler
+import tracing
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Item
+    from entity import Actor, Item
 
 MOVE_KEYS = {
     # Arrow keys.
@@ -43,8 +46,38 @@ CONFIRM_KEYS = {
     tcod.event.KeySym.KP_ENTER,
 }
 
+# 单独按下时不算输入的修饰键
+MODIFIER_KEYS = {
+    tcod.event.KeySym.LSHIFT,
+    tcod.event.KeySym.RSHIFT,
+    tcod.event.KeySym.LCTRL,
+    tcod.event.KeySym.RCTRL,
+    tcod.event.KeySym.LALT,
+    tcod.event.KeySym.RALT,
+}
+
 ActionOrHandler = Union[Action, "BaseEventHandler"]
 
+def coalesce_events(events: Iterable[tcod.event.Event]) -> List[tcod.event.Event]:
+    """合并一帧内冗余的输入事件。
+
+    连续的 MouseMotion 只保留最后一个；
+    按住移动键产生的自动重复 KeyDown 每帧最多保留一个，避免积压的输入在之后几秒内逐个执行。
+    """
+    coalesced: List[tcod.event.Event] = []
+    repeated_move = False
+    for event in events:
+        if isinstance(event, tcod.event.MouseMotion):
+            if coalesced and isinstance(coalesced[-1], tcod.event.MouseMotion):
+                coalesced[-1] = event
+                continue
+        elif isinstance(event, tcod.event.KeyDown) and event.repeat and event.sym in MOVE_KEYS:
+            if repeated_move:
+                continue
+            repeated_move = True
+        coalesced.append(event)
+    return coalesced
+
 class BaseEventHandler:
     def handle_events(self, event: tcod.event.Event) -> "BaseEventHandler":
         state = self.dispatch(event)
@@ -57,6 +90,19 @@ class BaseEventHandler:
     
     def on_render(self, console: tcod.console.Console) -> None:
         raise NotImplementedError()
+
+    def on_update(self) -> "BaseEventHandler":
+        """每帧渲染前调用一次，用于推进不依赖输入的工作。
+
+        返回下一帧使用的处理器。
+        """
+        return self
+
+    def ev_mousemotion(self, event: tcod.event.MouseMotion) -> Optional[Action]:
+        pass
+
+    def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[Action]:
+        pass
     
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
@@ -102,18 +148,25 @@ class EventHandler(BaseEventHandler):
         action_or_state = self.dispatch(event)
         if isinstance(action_or_state, BaseEventHandler):
             return action_or_state
+        if isinstance(action_or_state, actions.MultiTurnAction):
+            # 多回合动作分到之后的多帧中执行，中间照常渲染
+            return MultiTurnEventHandler(self.engine, action_or_state)
         if self.handle_action(action_or_state):
-            if not self.engine.player.is_alive:
-                return GameOverEventHandler(self.engine)
-            elif self.engine.game_world.current_floor > 7:
-                if is_finish_Easter_eggs(self.engine):
-                    return PopupMessage(parent_handler=GameOverEventHandler(self.engine), text="", needQuit= True, bgStr="assets/birthday.png")
-                else:
-                    return PopupMessage(parent_handler=GameOverEventHandler(self.engine), text="You win!", needQuit= True)
-            elif self.engine.player.level.requires_level_up:
-                return LevelUpEventHandler(self.engine)
-            return MainGameEventHandler(self.engine)
+            return self.after_turn()
         return self
+
+    def after_turn(self) -> BaseEventHandler:
+        """推进了回合之后，根据游戏状态返回下一个处理器。"""
+        if not self.engine.player.is_alive:
+            return GameOverEventHandler(self.engine)
+        elif self.engine.game_world.current_floor > 7:
+            if is_finish_Easter_eggs(self.engine):
+                return PopupMessage(parent_handler=GameOverEventHandler(self.engine), text="", needQuit= True, bgStr=asset_cache.BIRTHDAY_BACKGROUND)
+            else:
+                return PopupMessage(parent_handler=GameOverEventHandler(self.engine), text="You win!", needQuit= True)
+        elif self.engine.player.level.requires_level_up:
+            return LevelUpEventHandler(self.engine)
+        return MainGameEventHandler(self.engine)
     
     def handle_action(self, action: Optional[Action]) -> bool:
         """处理从事件方法返回的动作。
@@ -121,21 +174,51 @@ class EventHandler(BaseEventHandler):
 
         if action is None:
             return False
+
+        if self.engine.replay is not None:
+            self.engine.replay.record_action(action)
+
+        if isinstance(action, actions.MultiTurnAction):
+            return self.handle_multi_turn_action(action)
         
         try:
-            action.perform()
+            with frame_profiler.phase("handle_action"), tracing.span("Action.perform", action=type(action).__name__):
+                action.perform()
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  # 发生异常时跳过敌人回合
+        self.end_turn()
+
+        return True
+
+    def end_turn(self) -> None:
+        """玩家行动之后：敌人行动并更新视野。"""
         self.engine.handle_enemy_turns()
         self.engine.update_fov()
+        memory_diagnostics.on_turn(self.engine)
 
-        return True
+    def handle_multi_turn_action(self, action: actions.MultiTurnAction) -> bool:
+        """一次执行完多回合动作，中间不渲染；游戏中由 MultiTurnEventHandler 分多帧执行。
 
+        如果至少推进了一个回合则返回True。
+        """
+        run = MultiTurnRun(self, action)
+        run.advance()
+        return run.turns > 0
+
+
+    def tile_at(self, event: tcod.event.MouseState) -> Optional[Tuple[int, int]]:
+        """把鼠标所在的屏幕格子换算为地图坐标；不在镜头内时返回 None。"""
+        view = self.engine.game_map.viewport
+        x, y = view.to_map(event.tile.x, event.tile.y)
+        if view.contains(x, y):
+            return x, y
+        return None
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-           self.engine.mouse_location = event.tile.x, event.tile.y
+        xy = self.tile_at(event)
+        if xy is not None:
+           self.engine.mouse_location = xy
     
     def on_render(self, console: tcod.console.Console) -> None:
         self.engine.render(console)
@@ -147,6 +230,103 @@ class EventHandler(BaseEventHandler):
         # raise NotImplementedError()
         pass
 
+class MultiTurnRun:
+    """多回合动作的执行进度，可以分多次推进。
+
+    每一步之后照常运行敌人回合和视野更新。
+    发现新的怪物、出现新消息、某一步无法执行、玩家死亡或可以升级时停止。
+    """
+
+    def __init__(self, handler: EventHandler, action: actions.MultiTurnAction):
+        self.handler = handler
+        self.engine = handler.engine
+        self.action = action
+        self.name = type(action).__name__
+        self.steps = action.steps()
+        self.seen = set(self.visible_monsters())
+        self.turns = 0
+
+    def visible_monsters(self) -> List["Actor"]:
+        player = self.engine.player
+        return self.engine.game_map.visible_actors_near(
+            player.x, player.y, game_config.fov_radius, exclude=player
+        )
+
+    def log_state(self) -> Tuple[int, int]:
+        messages = self.engine.message_log.messages
+        return len(messages), messages[-1].count if messages else 0
+
+    def advance(self, max_turns: Optional[int] = None) -> bool:
+        """最多推进 `max_turns` 个回合（None 表示不限），动作结束时返回 True。"""
+        player = self.engine.player
+        turns = 0
+        with tracing.span("MultiTurnAction", action=self.name):
+            while max_turns is None or turns < max_turns:
+                if self.turns >= (self.action.max_turns or actions.MULTI_TURN_LIMIT):
+                    break
+                log_before = self.log_state()
+                try:
+                    step = next(self.steps, None)
+                    if step is None:
+                        break
+                    with frame_profiler.phase("handle_action"):
+                        step.perform()
+                except exceptions.Impossible as exc:
+                    if self.turns == 0:  # 第一步就无法执行时才提示，撞到墙停下不算错误
+                        self.engine.message_log.add_message(exc.args[0], color.impossible)
+                    break
+                self.handler.end_turn()
+                self.turns += 1
+                turns += 1
+
+                if not player.is_alive or player.level.requires_level_up:
+                    break
+                if self.log_state() != log_before:
+                    break
+                if any(monster not in self.seen for monster in self.visible_monsters()):
+                    break
+            else:
+                return False
+        return True
+
+
+class MultiTurnEventHandler(EventHandler):
+    """在游戏中执行多回合动作：每帧最多推进 game_config.multi_turn_turns_per_frame 个回合，
+    之间照常渲染，长时间的自动探索不会让画面卡住；这个值不大于 0 时一帧内执行完。
+
+    执行期间按任意键停止，已执行的回合数会写入录像，重放时在同一回合停下。
+    """
+
+    def __init__(self, engine: "Engine", action: actions.MultiTurnAction):
+        super().__init__(engine)
+        # 这个动作在录像中的记录序号，停止时要改写它
+        self.record_index: Optional[int] = None
+        if engine.replay is not None:
+            self.record_index = len(engine.replay)
+            engine.replay.record_action(action)
+        self.run = MultiTurnRun(self, action)
+
+    def on_update(self) -> BaseEventHandler:
+        turns_per_frame = game_config.multi_turn_turns_per_frame
+        if not self.run.advance(turns_per_frame if turns_per_frame > 0 else None):
+            return self
+        return self.finish()
+
+    def finish(self) -> BaseEventHandler:
+        if self.run.turns == 0:
+            return MainGameEventHandler(self.engine)
+        return self.after_turn()
+
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
+        # 按住方向键奔跑时的重复事件和单独的修饰键不算
+        if event.repeat or event.sym in MODIFIER_KEYS:
+            return None
+        self.run.action.max_turns = self.run.turns
+        if self.record_index is not None:
+            self.engine.replay.set_max_turns(self.record_index, self.run.turns)  # type: ignore
+        return self.finish()
+
+
 class MainGameEventHandler(EventHandler):
     """
     事件处理器协议类
@@ -182,7 +362,10 @@ class MainGameEventHandler(EventHandler):
 
         if key in MOVE_KEYS:
             dx, dy = MOVE_KEYS[key]
-            action = BumpAction(player, dx, dy)
+            if modifier & (tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT):
+                action = actions.RunAction(player, dx, dy)
+            else:
+                action = BumpAction(player, dx, dy)
         elif key in WAIT_KEYS:
             action = WaitAction(player)
         # 处理 ESC 键，创建退出动作
@@ -204,6 +387,12 @@ class MainGameEventHandler(EventHandler):
             return actions.TakeStairsAction(player)
         elif key == tcod.event.KeySym.SLASH:
             return LookHandler(self.engine)
+        elif key == tcod.event.KeySym.t:
+            return TravelHandler(self.engine)
+        elif key == tcod.event.KeySym.x:
+            action = actions.AutoExploreAction(player)
+        elif key == tcod.event.KeySym.F3:
+            frame_profiler.toggle()
             
         # 返回处理后的动作，如果没有匹配的按键则返回 None
         return action
@@ -290,14 +479,7 @@ class AskUserEventHandler(EventHandler):
     """处理需要特殊输入的动作的用户输入。"""
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
         """默认情况下，任何键都会退出此输入处理器。"""
-        if event.sym in {  # 忽略修饰键
-            tcod.event.KeySym.LSHIFT,
-            tcod.event.KeySym.RSHIFT,
-            tcod.event.KeySym.LCTRL,
-            tcod.event.KeySym.RCTRL,
-            tcod.event.KeySym.LALT,
-            tcod.event.KeySym.RALT,
-        }:
+        if event.sym in MODIFIER_KEYS:  # 忽略修饰键
             return None
         return self.on_exit()
 
@@ -405,6 +587,8 @@ class LevelUpEventHandler(AskUserEventHandler):
         index = key - tcod.event.KeySym.a
 
         if 0 <= index <= 2:
+            if self.engine.replay is not None:
+                self.engine.replay.record_level_up(index)
             if index == 0:
                 player.level.increase_max_hp()
             elif index == 1:
@@ -538,7 +722,7 @@ class SelectIndexHandler(AskUserEventHandler):
     def on_render(self, console: tcod.console.Console) -> None:
         """Highlight the tile under the cursor."""
         super().on_render(console)
-        x, y = self.engine.mouse_location
+        x, y = self.engine.game_map.viewport.to_screen(*self.engine.mouse_location)
         console.rgb["bg"][x, y] = color.white
         console.rgb["fg"][x, y] = color.black
 
@@ -558,8 +742,10 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            x = max(0, min(x, self.engine.game_map.width - 1))
-            y = max(0, min(y, self.engine.game_map.height - 1))
+            # 光标限制在镜头内
+            view = self.engine.game_map.viewport
+            x = max(view.x, min(x, view.x + view.width - 1))
+            y = max(view.y, min(y, view.y + view.height - 1))
             self.engine.mouse_location = x, y
             return None
 
@@ -570,9 +756,10 @@ class SelectIndexHandler(AskUserEventHandler):
     
     def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[ActionOrHandler]:
         """鼠标点击事件"""
-        if self.engine.game_map.in_bounds(*event.tile):
+        xy = self.tile_at(event)
+        if xy is not None:
             if event.button == 1:
-                return self.on_index_selected(*event.tile)
+                return self.on_index_selected(*xy)
             
         return super().ev_mousebuttondown(event)
 
@@ -588,6 +775,12 @@ class LookHandler(SelectIndexHandler):
         """Return to main handler."""
         return MainGameEventHandler(self.engine)
 
+# 前往选择的位置
+class TravelHandler(SelectIndexHandler):
+    """选择一个位置，沿已探索区域连续行走过去。"""
+    def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
+        return actions.TravelAction(self.engine.player, x, y)
+
 # 单次远程选择攻击
 class SingleRangedAttackHandler(SelectIndexHandler):
     """处理针对单个敌人的操作。只有选定的敌人会受到影响"""
@@ -611,10 +804,11 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         super().on_render(console)
         x, y = self.engine.mouse_location
 
-        for c_x in range(x - self.radius - 1, x + self.radius + 1):
-            for c_y in range(y - self.radius - 1, y + self.radius + 1):
-                if (c_x - x) ** 2 + (c_y - y) ** 2 <= self.radius ** 2:
-                    console.rgb["bg"][c_x, c_y] = color.red
+        window, mask = self.engine.game_map.radius_mask(x, y, self.radius)
+        clipped = self.engine.game_map.viewport.clip(window)
+        if clipped is not None:
+            screen, local = clipped
+            console.rgb["bg"][screen][mask[local]] = color.red
 
     def on_index_selected(self, x: int, y: int) -> Optional[Action]:
         return self.callback((x, y))
@@ -636,7 +830,7 @@ class PopupMessage(BaseEventHandler):
         console.rgb["bg"] //= 8
 
         if (self.bgStr):
-            background_image = load_and_resize_image(self.bgStr, game_config.screen_width * 2, game_config.screen_height * 2)
+            background_image = asset_cache.load_background(self.bgStr)
             console.draw_semigraphics(background_image, 0, 0)
 
         console.print(
@@ -661,6 +855,9 @@ class HelpViewer(EventHandler):
         super().__init__(engine)
         self.help_items = [
             ("move", "WASD/Arrow"),
+            ("run", "Shift+Move"),
+            ("travel", "T"),
+            ("explore", "X"),
             ("wait", "P"),
             ("pickup", "G"),
             ("use", "I"),
@@ -668,6 +865,7 @@ class HelpViewer(EventHandler):
             ("character", "C"),
             ("history", "V"),
             ("select map", "/"),
+            ("profiler", "F3"),
             ("quit", "ESC"),
         ]
 
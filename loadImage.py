@@ -1,7 +1,9 @@
-from PIL import Image
 import numpy as np
 def load_and_resize_image(path, width, height):
+    # PIL 只在第一次加载图片时导入，不拖慢启动
+    from PIL import Image
+
     img = Image.open(path).convert("RGB")
     img = img.resize((width, height), Image.LANCZOS)
     arr = np.array(img)
-    return arr
\ No newline at end of file
+    return arr
@@ -1,10 +1,20 @@
 # 导入 tcod 库，这是一个用于开发 Roguelike 游戏的 Python 库
+import argparse
+from typing import List, Optional
+
 import tcod
 import color
 import traceback
 import exceptions
+import game_config
 import input_handlers
+import memory_diagnostics
+import replay
 import setup_game
+import startup_profile
+import tracing
+from frame_pacing import FrameScheduler
+from profiler import frame_profiler
 from game_config import screen_width, screen_height
 
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
@@ -13,7 +23,84 @@ def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
         handler.engine.save_as(filename)
         print("Game saved.")
 
-def main():
+def save_replay(handler: input_handlers.BaseEventHandler, filename: str) -> None:
+    """If the current event handler has an active Engine then write its replay."""
+    if isinstance(handler, input_handlers.EventHandler) and handler.engine.replay is not None:
+        handler.engine.replay.save(filename, handler.engine)
+        print(f"Replay written to {filename}.")
+
+def report_error(handler: input_handlers.BaseEventHandler) -> input_handlers.BaseEventHandler:
+    """Print the current exception to stderr and the message log, and keep playing."""
+    traceback.print_exc()  # Print error to stderr.
+    # 录像中已包含出错的动作，用 --replay 可以重现
+    save_replay(handler, replay.CRASH_FILE)
+    # Then print the error to the message log.
+    if isinstance(handler, input_handlers.EventHandler):
+        handler.engine.message_log.add_message(
+            traceback.format_exc(), color.error
+        )
+    # 出错的多回合动作不再继续执行
+    if isinstance(handler, input_handlers.MultiTurnEventHandler):
+        return input_handlers.MainGameEventHandler(handler.engine)
+    return handler
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tombs of the Ancient Kings")
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help=f"record engine phases as Chrome trace-event JSON (also enabled by ${tracing.ENV_VAR})",
+    )
+    parser.add_argument(
+        "--memory-profile",
+        nargs="?",
+        const=memory_diagnostics.DEFAULT_LOG,
+        metavar="FILE",
+        help=f"log tracemalloc snapshots per floor and every N turns (also enabled by ${memory_diagnostics.ENV_VAR})",
+    )
+    parser.add_argument(
+        "--memory-interval", type=int, default=100, metavar="N", help="turns between memory snapshots"
+    )
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=game_config.target_fps,
+        metavar="N",
+        help="target frame rate; 0 renders as fast as possible and disables vsync",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="write the replay of the current game to FILE on exit",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="replay a recorded game headlessly as fast as possible and exit",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print an import-time breakdown of the game's startup and exit",
+    )
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.startup_profile:
+        startup_profile.report()
+        return
+    if args.replay:
+        replay.play(args.replay)
+        return
+    if args.trace:
+        tracing.start(args.trace)
+    else:
+        tracing.start_from_env()
+    if args.memory_profile:
+        memory_diagnostics.start(args.memory_profile, args.memory_interval)
+    else:
+        memory_diagnostics.start_from_env()
 
     # 加载游戏使用的字体图集
     # dejavu10x10_gs_tc.png: 字体文件
@@ -30,43 +117,56 @@ def main():
     # columns, rows: 窗口尺寸
     # tileset: 使用的字体图集
     # title: 窗口标题
-    # vsync: 启用垂直同步，防止画面撕裂
+    # vsync: 垂直同步，防止画面撕裂
+    scheduler = FrameScheduler(args.fps)
     with tcod.context.new(
         columns=screen_width,
         rows=screen_height,
         tileset=tileset,
         title="Hello World",
-        vsync=True,
+        vsync=game_config.vsync and not scheduler.unlimited,
     ) as context:
         # 创建主控制台对象
         root_console = tcod.console.Console(screen_width, screen_height, order="F")
         
         try:
             while True:
-                root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
+                with tracing.span("frame"):
+                    frame_profiler.begin_frame()
+                    try:
+                        handler = handler.on_update()
+                    except Exception:  # Handle exceptions in game.
+                        handler = report_error(handler)
+                    root_console.clear()
+                    handler.on_render(console=root_console)
+                    with frame_profiler.phase("present"):
+                        context.present(root_console)
 
-                try:
-                    for event in tcod.event.get():
-                        context.convert_event(event)
-                        handler = handler.handle_events(event)
-                    tcod.event.wait(0.016) #60FPS
-                except Exception:  # Handle exceptions in game.
-                    traceback.print_exc()  # Print error to stderr.
-                    # Then print the error to the message log.
-                    if isinstance(handler, input_handlers.EventHandler):
-                        handler.engine.message_log.add_message(
-                            traceback.format_exc(), color.error
-                        )
+                    try:
+                        with frame_profiler.phase("events"):
+                            for event in input_handlers.coalesce_events(tcod.event.get()):
+                                context.convert_event(event)
+                                handler = handler.handle_events(event)
+                        frame_profiler.end_frame()
+                    except Exception:  # Handle exceptions in game.
+                        handler = report_error(handler)
+                scheduler.wait()
         except exceptions.QuitWithoutSaving:
+            # 结束的游戏不存档，但录像照常写出；之后再删除这层地图的 memmap 文件
+            if args.record:
+                save_replay(handler, args.record)
+            if isinstance(handler, input_handlers.EventHandler):
+                handler.engine.game_map.release_storage()
             raise
         except SystemExit:  # Save and quit.
             # TODO: Add the save function here
             save_game(handler, "savegame.sav")
+            if args.record:
+                save_replay(handler, args.record)
             raise
         except BaseException:  # Save on any other unexpected exception.
             # TODO: Add the save function here
+            save_replay(handler, replay.CRASH_FILE)
             save_game(handler, "savegame.sav")
             raise
                         
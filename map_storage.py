@@ -0,0 +1,308 @@
+"""地图数组（地形、可见、已探索、地形图层）的存储方式，由 game_config.map_storage 选择。
+
+dense：完整的 NumPy 数组，占用的内存与地图的外接矩形成正比。
+chunked：切成 chunk_size x chunk_size 的块，只有写入过与默认值不同的块才会分配，
+从未挖开的实心墙壁、从未探索过的区域都不占内存，适合非常大但稀疏的地图。
+memmap：每层地图的数组是 game_config.map_storage_dir 下一个目录中的 .npy 文件，
+通过 numpy.memmap 访问，只有读写过的页面才会载入内存。存档时只写入文件路径，
+保存一层地图只需要把文件刷到磁盘，读档时重新映射文件，数据按需分页读入。
+
+ChunkedArray 支持游戏中用到的索引方式：单个格子、矩形窗口（返回普通数组）、
+坐标数组、布尔掩码赋值，以及按字段名取只读视图（例如 tiles["walkable"]）。
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+
+import exceptions
+import game_config
+
+Window = Tuple[slice, slice]
+
+
+class ChunkedArray:
+    """按块按需分配的二维数组，未分配的块视为全部是 `fill_value`。"""
+
+    ndim = 2
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        fill_value: np.ndarray,
+        dtype: Optional[np.dtype] = None,
+        chunk_size: int = 64,
+    ):
+        self.shape = shape
+        self.dtype = np.dtype(dtype if dtype is not None else np.asarray(fill_value).dtype)
+        self.fill_value = np.asarray(fill_value, dtype=self.dtype)
+        self.chunk_size = chunk_size
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}
+        self.field: Optional[str] = None  # 字段视图读取的字段名
+
+    @property
+    def nbytes(self) -> int:
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self[0:self.shape[0], 0:self.shape[1]]
+        return array if dtype is None else array.astype(dtype)
+
+    def windows(self) -> Iterator[Window]:
+        """已分配的块在地图上的窗口。"""
+        size = self.chunk_size
+        for cx, cy in self.chunks:
+            yield (
+                slice(cx * size, min((cx + 1) * size, self.shape[0])),
+                slice(cy * size, min((cy + 1) * size, self.shape[1])),
+            )
+
+    def sum(self) -> int:
+        """所有格子的和（按数值理解，用于布尔数组计数）。"""
+        allocated = sum(int(chunk.sum()) for chunk in self.chunks.values())
+        if not self.fill_value:
+            return allocated
+        cells = self.shape[0] * self.shape[1] - sum(chunk.size for chunk in self.chunks.values())
+        return allocated + cells * int(self.fill_value)
+
+    def _field_view(self, name: str) -> "ChunkedArray":
+        if self.field is not None:
+            raise IndexError("Nested field access is not supported.")
+        view = ChunkedArray.__new__(ChunkedArray)
+        view.__dict__.update(self.__dict__)
+        view.field = name
+        return view
+
+    def _result(self, array: np.ndarray) -> np.ndarray:
+        return array if self.field is None else array[self.field]
+
+    def _chunk(self, key: Tuple[int, int]) -> np.ndarray:
+        """返回某个块，必要时分配它。"""
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            size = self.chunk_size
+            chunk = self.chunks[key] = np.full((size, size), self.fill_value, dtype=self.dtype, order="F")
+        return chunk
+
+    def _window(self, key: Tuple[slice, slice]) -> Window:
+        (x0, x1, x_step), (y0, y1, y_step) = key[0].indices(self.shape[0]), key[1].indices(self.shape[1])
+        if x_step != 1 or y_step != 1:
+            raise IndexError("ChunkedArray slices must have a step of 1.")
+        return slice(x0, max(x0, x1)), slice(y0, max(y0, y1))
+
+    def _overlaps(self, window: Window) -> Iterator[Tuple[Tuple[int, int], Window, Window]]:
+        """遍历与窗口重叠的每个块，给出 (块坐标, 块内切片, 窗口内切片)。"""
+        size = self.chunk_size
+        x0, x1 = window[0].start, window[0].stop
+        y0, y1 = window[1].start, window[1].stop
+        for cx in range(x0 // size, (x1 - 1) // size + 1 if x1 > x0 else x0 // size):
+            for cy in range(y0 // size, (y1 - 1) // size + 1 if y1 > y0 else y0 // size):
+                left, right = max(x0, cx * size), min(x1, (cx + 1) * size)
+                top, bottom = max(y0, cy * size), min(y1, (cy + 1) * size)
+                yield (
+                    (cx, cy),
+                    (slice(left - cx * size, right - cx * size), slice(top - cy * size, bottom - cy * size)),
+                    (slice(left - x0, right - x0), slice(top - y0, bottom - y0)),
+                )
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._field_view(key)
+        if isinstance(key, slice):
+            key = key, slice(None)
+        x, y = key
+        if isinstance(x, (int, np.integer)) and isinstance(y, (int, np.integer)):
+            # 单个格子，游戏逻辑中最常见的查询
+            if not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+                raise IndexError(f"Index {(x, y)} is out of bounds for shape {self.shape}.")
+            size = self.chunk_size
+            chunk = self.chunks.get((x // size, y // size))
+            value = self.fill_value[()] if chunk is None else chunk[x % size, y % size]
+            return value if self.field is None else value[self.field]
+        if isinstance(x, slice) and isinstance(y, slice):
+            window = self._window(key)
+            shape = window[0].stop - window[0].start, window[1].stop - window[1].start
+            out = np.empty(shape, dtype=self.dtype, order="F")
+            for chunk_key, inner, outer in self._overlaps(window):
+                chunk = self.chunks.get(chunk_key)
+                out[outer] = self.fill_value if chunk is None else chunk[inner]
+            return self._result(out)
+        # 坐标数组：按所在的块分组读取
+        xs, ys = np.asarray(x, dtype=np.intp), np.asarray(y, dtype=np.intp)
+        out = np.full(xs.shape, self.fill_value, dtype=self.dtype)
+        size = self.chunk_size
+        cxs, cys = xs // size, ys // size
+        for chunk_key, chunk in self.chunks.items():
+            inside = (cxs == chunk_key[0]) & (cys == chunk_key[1])
+            if inside.any():
+                out[inside] = chunk[xs[inside] % size, ys[inside] % size]
+        return self._result(out)
+
+    def __setitem__(self, key, value) -> None:
+        if self.field is not None:
+            raise TypeError("Field views of a ChunkedArray are read-only.")
+        if isinstance(key, np.ndarray) and key.dtype == bool:
+            self._set_mask(key, value)
+            return
+        if isinstance(key, slice):
+            key = key, slice(None)
+        x, y = key
+        if isinstance(x, slice) and isinstance(y, slice):
+            self._set_window(self._window(key), value)
+            return
+        x, y = int(x), int(y)
+        if not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            raise IndexError(f"Index {(x, y)} is out of bounds for shape {self.shape}.")
+        chunk_key = x // self.chunk_size, y // self.chunk_size
+        value = np.asarray(value, dtype=self.dtype)
+        if chunk_key not in self.chunks and value == self.fill_value:
+            return
+        self._chunk(chunk_key)[x % self.chunk_size, y % self.chunk_size] = value
+
+    def _set_window(self, window: Window, value) -> None:
+        shape = window[0].stop - window[0].start, window[1].stop - window[1].start
+        value = np.broadcast_to(np.asarray(value, dtype=self.dtype), shape)
+        for chunk_key, inner, outer in self._overlaps(window):
+            part = value[outer]
+            # 不为只包含默认值的部分分配新块
+            if chunk_key not in self.chunks and (part == self.fill_value).all():
+                continue
+            self._chunk(chunk_key)[inner] = part
+
+    def _set_mask(self, mask: np.ndarray, value) -> None:
+        if mask.shape != self.shape:
+            raise IndexError(f"Boolean index of shape {mask.shape} does not match {self.shape}.")
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim:
+            raise ValueError("Only scalar values can be assigned through a boolean mask.")
+        whole = slice(0, self.shape[0]), slice(0, self.shape[1])
+        for chunk_key, inner, outer in self._overlaps(whole):
+            part = mask[outer]
+            if not part.any() or (chunk_key not in self.chunks and value == self.fill_value):
+                continue
+            self._chunk(chunk_key)[inner][part] = value
+
+
+class MappedFile(NamedTuple):
+    """memmap 数组在存档中的形式：只记录 .npy 文件的路径，数据留在文件里。"""
+
+    path: str
+
+
+ArrayLike = Union[np.ndarray, ChunkedArray]
+
+# memmap 存储中每层地图的目录名前缀
+FLOOR_PREFIX = "floor-"
+
+
+def new_directory() -> str:
+    """在 game_config.map_storage_dir 下为一层地图创建新的目录。"""
+    os.makedirs(game_config.map_storage_dir, exist_ok=True)
+    return os.path.relpath(tempfile.mkdtemp(prefix=FLOOR_PREFIX, dir=game_config.map_storage_dir))
+
+
+def remove_directory(directory: str) -> None:
+    """删除一层地图的目录及其中的文件。"""
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def prune_directories(keep: Iterable[str]) -> None:
+    """删除 game_config.map_storage_dir 下除 `keep` 以外的所有地图目录。"""
+    root = game_config.map_storage_dir
+    if not os.path.isdir(root):
+        return
+    keep = {os.path.abspath(directory) for directory in keep}
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(FLOOR_PREFIX) and os.path.abspath(path) not in keep:
+            remove_directory(path)
+
+
+def _new_memmap(path: str, shape: Tuple[int, int], fill_value: np.ndarray, dtype: Optional[np.dtype]) -> np.memmap:
+    fill_value = np.asarray(fill_value, dtype=dtype)
+    array = np.lib.format.open_memmap(path, mode="w+", dtype=fill_value.dtype, shape=shape, fortran_order=True)
+    # 新文件内容全是 0，默认值也是 0 时不必写入，文件保持稀疏
+    if fill_value.tobytes().strip(b"\0"):
+        array[...] = fill_value
+    return array
+
+
+def new_array(
+    storage: str,
+    shape: Tuple[int, int],
+    fill_value: np.ndarray,
+    dtype: Optional[np.dtype] = None,
+    path: Optional[str] = None,
+) -> ArrayLike:
+    """按 `storage` 创建一个填满 `fill_value` 的二维地图数组。
+
+    memmap 存储需要提供 `path`，数组保存在该 .npy 文件中，已有的文件会被覆盖。
+    """
+    if storage == "dense":
+        return np.full(shape, fill_value=fill_value, dtype=dtype, order="F")
+    if storage == "chunked":
+        return ChunkedArray(shape, fill_value, dtype, chunk_size=game_config.map_chunk_size)
+    if storage == "memmap":
+        if path is None:
+            raise ValueError("Memory-mapped map storage needs a file path.")
+        return _new_memmap(path, shape, fill_value, dtype)
+    raise ValueError(f"Unknown map storage {storage!r}.")
+
+
+def to_state(array: ArrayLike) -> Union[ArrayLike, MappedFile]:
+    """存档时调用：memmap 数组刷到磁盘后只保存文件路径，其他数组原样保存。"""
+    if isinstance(array, np.memmap):
+        array.flush()
+        return MappedFile(os.path.relpath(array.filename))
+    return array
+
+
+def from_state(value: Union[ArrayLike, MappedFile]) -> ArrayLike:
+    """读档时调用：按路径重新映射 memmap 文件，不会读入数据。"""
+    if not isinstance(value, MappedFile):
+        return value
+    try:
+        return np.load(value.path, mmap_mode="r+")
+    except (OSError, ValueError) as exc:
+        raise exceptions.InvalidSaveFile(f"Cannot open map file {value.path!r}: {exc}") from exc
+
+
+def windows(array: ArrayLike) -> Iterator[Window]:
+    """可能包含非默认值的窗口：普通数组是整张地图，分块数组是每个已分配的块。
+
+    memmap 数组按 map_chunk_size 行为一段逐段给出，避免一次读入整个文件。
+    """
+    if isinstance(array, ChunkedArray):
+        yield from array.windows()
+    elif isinstance(array, np.memmap):
+        step = game_config.map_chunk_size
+        for y in range(0, array.shape[1], step):
+            yield slice(0, array.shape[0]), slice(y, min(y + step, array.shape[1]))
+    else:
+        yield slice(0, array.shape[0]), slice(0, array.shape[1])
+
+
+def bounds(array: ArrayLike) -> Optional[Window]:
+    """布尔数组中所有 True 格子的外接矩形；没有 True 时返回 None。"""
+    x0 = y0 = None
+    x1 = y1 = 0
+    for window in windows(array):
+        part = array[window]
+        columns, rows = np.flatnonzero(part.any(axis=1)), np.flatnonzero(part.any(axis=0))
+        if not len(columns):
+            continue
+        left, right = window[0].start + columns[0], window[0].start + columns[-1] + 1
+        top, bottom = window[1].start + rows[0], window[1].start + rows[-1] + 1
+        x0 = left if x0 is None else min(x0, left)
+        y0 = top if y0 is None else min(y0, top)
+        x1, y1 = max(x1, right), max(y1, bottom)
+    if x0 is None:
+        return None
+    return slice(int(x0), int(x1)), slice(int(y0), int(y1))
@@ -0,0 +1,138 @@
+"""基于 tracemalloc 的内存诊断模式。
+
+通过命令行参数 --memory-profile [FILE] 或环境变量 TOAK_MEMORY_PROFILE=<文件> 启用。
+每生成一层地图以及每隔 `interval` 个回合记录一次快照，把内存按子系统归类，
+并把与上一次快照相比的增量追加写入日志文件。
+"""
+from __future__ import annotations
+
+import gc
+import os
+import time
+import tracemalloc
+from typing import Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+ENV_VAR = "TOAK_MEMORY_PROFILE"
+DEFAULT_LOG = "memory.log"
+
+# 记录的调用栈深度，用来越过 copy/numpy 等库找到游戏代码中的分配位置
+TRACEBACK_DEPTH = 16
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 游戏源文件（相对路径）到子系统的映射，未列出的文件归入 other
+SUBSYSTEMS = {
+    "game_map.py": "tiles",
+    "map_storage.py": "tiles",
+    "tile_types.py": "tiles",
+    "procgen.py": "tiles",
+    "entity.py": "entities",
+    "entity_factories.py": "entities",
+    os.path.join("components", "fighter.py"): "entities",
+    os.path.join("components", "inventory.py"): "entities",
+    os.path.join("components", "equipment.py"): "entities",
+    os.path.join("components", "level.py"): "entities",
+    os.path.join("components", "consumable.py"): "entities",
+    os.path.join("components", "equippable.py"): "entities",
+    "message_log.py": "message_log",
+    os.path.join("components", "damage_popup.py"): "damage_popups",
+    os.path.join("components", "ai.py"): "path_caches",
+    "main.py": "main_loop",
+}
+
+
+class MemoryDiagnostics:
+    def __init__(self, filename: str, interval: int):
+        self.filename = filename
+        self.interval = interval
+        self.turns = 0
+        self.previous: Dict[str, int] = {}
+        tracemalloc.start(TRACEBACK_DEPTH)
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(f"# memory diagnostics started {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+    @staticmethod
+    def classify(snapshot: tracemalloc.Snapshot) -> Dict[str, int]:
+        """按子系统统计快照中的内存（字节）。"""
+        usage: Dict[str, int] = {name: 0 for name in sorted(set(SUBSYSTEMS.values()))}
+        usage["other"] = 0
+        for stat in snapshot.statistics("traceback"):
+            subsystem = "other"
+            # 从最近的调用开始，找到第一个属于游戏代码的栈帧
+            for frame in reversed(stat.traceback):
+                if frame.filename.startswith(ROOT):
+                    subsystem = SUBSYSTEMS.get(os.path.relpath(frame.filename, ROOT), "other")
+                    break
+            usage[subsystem] += stat.size
+        return usage
+
+    @staticmethod
+    def counts(engine: "Engine") -> Dict[str, int]:
+        """与内存增长相关的对象数量。"""
+        game_map = engine.game_map
+        path_steps = sum(len(getattr(actor.ai, "path", ())) for actor in game_map.actors)
+        return {
+            "entities": len(game_map.entities),
+            "messages": len(engine.message_log.messages),
+            "popups": len(engine.damage_popup_manager.popups),
+            "path_steps": path_steps,
+            "tile_bytes": game_map.tiles.nbytes + game_map.visible.nbytes + game_map.explored.nbytes,
+        }
+
+    def snapshot(self, engine: "Engine", label: str) -> None:
+        gc.collect()  # 先回收循环引用（例如上一层地图），只统计真正存活的对象
+        usage = self.classify(tracemalloc.take_snapshot())
+        usage["total"] = sum(usage.values())
+
+        def mib(size: int) -> str:
+            return f"{size / 2 ** 20:.2f}"
+
+        parts = []
+        for name, size in usage.items():
+            delta = size - self.previous.get(name, size)
+            parts.append(f"{name} {mib(size)} MiB ({'+' if delta >= 0 else ''}{mib(delta)})")
+        counts = " ".join(f"{name}={value}" for name, value in self.counts(engine).items())
+
+        with open(self.filename, "a", encoding="utf-8") as f:
+            f.write(
+                f"[{label} turn={self.turns} floor={engine.game_world.current_floor}] "
+                + " | ".join(parts)
+                + f" | {counts}\n"
+            )
+        self.previous = usage
+
+    def on_floor_generated(self, engine: "Engine") -> None:
+        self.snapshot(engine, "floor")
+
+    def on_turn(self, engine: "Engine") -> None:
+        self.turns += 1
+        if self.turns % self.interval == 0:
+            self.snapshot(engine, "turns")
+
+
+_diagnostics: Optional[MemoryDiagnostics] = None
+
+
+def start(filename: Optional[str] = None, interval: int = 100) -> None:
+    """开启诊断模式，快照写入 `filename`。"""
+    global _diagnostics
+    _diagnostics = MemoryDiagnostics(filename or DEFAULT_LOG, interval)
+
+
+def start_from_env() -> None:
+    filename = os.environ.get(ENV_VAR)
+    if filename:
+        start(filename)
+
+
+def on_floor_generated(engine: "Engine") -> None:
+    if _diagnostics is not None:
+        _diagnostics.on_floor_generated(engine)
+
+
+def on_turn(engine: "Engine") -> None:
+    if _diagnostics is not None:
+        _diagnostics.on_turn(engine)
@@ -1,10 +1,13 @@
+import itertools
 import random
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
 
+import numpy as np  # type: ignore
 import tcod
 import entity_factories
 from game_map import GameMap
 import tile_types
+import tracing
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -64,31 +67,51 @@ def get_max_value_for_floor(
     return current_value
 
 
-def get_entities_at_random(
-    weighted_chances_by_floor: Dict[int, List[Tuple["Entity", int]]],
-    number_of_entities: int,
-    floor: int,
-) -> List["Entity"]:
-    entity_weighted_chances = {}
-
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
-            entity_weighted_chances[entity] = weighted_chance
-
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
-    )
-
-    return chosen_entities
+class SpawnTable:
+    """某一层的生成表。
+
+    最大数量和累积权重在生成这一层时只计算一次，之后所有房间的敌人和物品
+    用 random.choices(cum_weights=...) 一次抽出（内部用二分查找）。
+    """
+
+    def __init__(self, floor_number: int):
+        self.floor_number = floor_number
+        self.max_monsters = get_max_value_for_floor(max_monsters_by_floor, floor_number)
+        self.max_items = get_max_value_for_floor(max_items_by_floor, floor_number)
+        self.monsters, self.monster_weights = self.cumulative_weights(enemy_chances, floor_number)
+        self.items, self.item_weights = self.cumulative_weights(item_chances, floor_number)
+
+    @staticmethod
+    def cumulative_weights(
+        weighted_chances_by_floor: Dict[int, List[Tuple["Entity", int]]], floor: int
+    ) -> Tuple[List["Entity"], List[int]]:
+        """合并不超过 `floor` 的所有条目，同一实体以较高楼层的权重为准。"""
+        entity_weighted_chances: Dict["Entity", int] = {}
+
+        for key, values in weighted_chances_by_floor.items():
+            if key > floor:
+                break
+            for entity, weighted_chance in values:
+                entity_weighted_chances[entity] = weighted_chance
+
+        return list(entity_weighted_chances), list(itertools.accumulate(entity_weighted_chances.values()))
+
+    def roll(self, areas: int) -> List[List["Entity"]]:
+        """一次抽出 `areas` 个房间（或洞穴中的区域）各自的敌人和物品。"""
+        counts = [
+            (random.randint(0, self.max_monsters), random.randint(0, self.max_items)) for _ in range(areas)
+        ]
+        number_of_monsters = sum(monsters for monsters, _ in counts)
+        number_of_items = sum(items for _, items in counts)
+
+        print(f"Placing {number_of_monsters} monsters and {number_of_items} items in {areas} areas on floor {self.floor_number}")
+
+        monsters = iter(random.choices(self.monsters, cum_weights=self.monster_weights, k=number_of_monsters))
+        items = iter(random.choices(self.items, cum_weights=self.item_weights, k=number_of_items))
+        return [
+            list(itertools.islice(monsters, monster_count)) + list(itertools.islice(items, item_count))
+            for monster_count, item_count in counts
+        ]
 
 class RectangularRoom:
     def __init__(self, x: int, y: int, width: int, height: int):
@@ -122,37 +145,28 @@ class RectangularRoom:
             and self.y2 >= other.y1
         )
 
-def place_entities(room: RectangularRoom, dungeon: GameMap, floor_number: int,) -> None:
-    number_of_monsters = random.randint(
-        0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
-    )
-    number_of_items = random.randint(
-        0, get_max_value_for_floor(max_items_by_floor, floor_number)
-    )
-
-    print(f"Placing {number_of_monsters} monsters and {number_of_items} items on floor {floor_number}")
-
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number
-    )   
+def place_entities(rooms: List[RectangularRoom], dungeon: GameMap, floor_number: int,) -> None:
+    for room, entities in zip(rooms, SpawnTable(floor_number).roll(len(rooms))):
+        place_entities_in_room(room, dungeon, entities)
 
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number
-    )
-
-    for entity in monsters + items:
+def place_entities_in_room(room: RectangularRoom, dungeon: GameMap, entities: List["Entity"]) -> None:
+    # 房间互不重叠，房间里只可能有玩家和这里放下的实体，不必遍历地图上的所有实体
+    player = dungeon.engine.player
+    occupied = {(player.x, player.y)}
+    for entity in entities:
         isPlaced = False
         while not isPlaced:
             x = random.randint(room.x1 + 1, room.x2 - 1)
             y = random.randint(room.y1 + 1, room.y2 - 1)
-            if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+            if (x, y) not in occupied:
                 entity.spawn(dungeon, x, y)
+                occupied.add((x, y))
                 isPlaced = True
 
 def tunnel_between(
     start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-    """返回从这两个点之间绘制一个L形隧道"""
+) -> List[Tuple[slice, slice]]:
+    """返回这两个点之间L形隧道的两段，每段都是可以直接用于二维数组的切片"""
     x1, y1 = start
     x2, y2 = end
     if random.random() < 0.5:  # 50% chance.
@@ -162,13 +176,30 @@ def tunnel_between(
         # 垂直移动，然后水平移动
         corner_x, corner_y = x1, y2
 
-    # 生成这个隧道的坐标
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    # 两段都与坐标轴平行，各自就是一个宽或高为 1 的矩形
+    return [
+        (slice(min(x1, corner_x), max(x1, corner_x) + 1), slice(min(y1, corner_y), max(y1, corner_y) + 1)),
+        (slice(min(corner_x, x2), max(corner_x, x2) + 1), slice(min(corner_y, y2), max(corner_y, y2) + 1)),
+    ]
 
 
+def carve_tunnels(dungeon: GameMap, tunnels: List[Tuple[slice, slice]]) -> None:
+    """先在布尔掩码上画出一层的所有隧道，再一次性把它们赋值为地面。
+
+    每次给 tiles 赋值都要复制完整的结构化记录，合并之后重叠的格子也只复制一次。
+    """
+    if not isinstance(dungeon.tiles, np.ndarray):
+        # 分块存储时逐段赋值，不分配整张地图大小的掩码
+        for segment in tunnels:
+            dungeon.tiles[segment] = tile_types.floor
+        return
+    corridors = np.zeros((dungeon.width, dungeon.height), dtype=bool, order="F")
+    for segment in tunnels:
+        corridors[segment] = True
+    dungeon.tiles[corridors] = tile_types.floor
+
+
+@tracing.traced("generate_dungeon")
 def generate_dungeon(
     max_rooms: int,
     room_min_size: int,
@@ -182,6 +213,7 @@ def generate_dungeon(
     dungeon = GameMap(engine, map_width, map_height, entities=[player])
 
     rooms: List[RectangularRoom] = []   
+    tunnels: List[Tuple[slice, slice]] = []
 
     center_of_last_room = (0, 0)
     new_room = None
@@ -209,23 +241,31 @@ def generate_dungeon(
             # 第一个房间，玩家的起始位置
             player.place(*new_room.center, dungeon)
         else:  # 之后的所有房间
-            # 挖一条隧道连接当前房间和上一个房间
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+            # 记下连接当前房间和上一个房间的隧道，最后一起挖出
+            tunnels.extend(tunnel_between(rooms[-1].center, new_room.center))
 
             center_of_last_room = new_room.center
 
-        place_entities(new_room, dungeon, engine.game_world.current_floor)
-
-        dungeon.tiles[center_of_last_room] = tile_types.down_stairs
-        dungeon.downstairs_location = center_of_last_room
-
         # 最后，把新房间加入房间列表
         rooms.append(new_room)
 
-    # 随机选择一个房间放置彩蛋
-    if engine.game_world.current_floor in egg_entity_by_floor:
-        egg_entity = egg_entity_by_floor[engine.game_world.current_floor]
+    carve_tunnels(dungeon, tunnels)
+    place_entities(rooms, dungeon, engine.game_world.current_floor)
+
+    # 楼梯在挖完隧道之后放置，不会被隧道覆盖
+    dungeon.tiles[center_of_last_room] = tile_types.down_stairs
+    dungeon.downstairs_location = center_of_last_room
+    dungeon.mark_terrain_changed()
+
+    place_egg(rooms, dungeon, engine.game_world.current_floor)
+
+    return dungeon
+
+
+def place_egg(rooms: List[RectangularRoom], dungeon: GameMap, floor_number: int) -> None:
+    """随机选择一个房间放置彩蛋"""
+    if floor_number in egg_entity_by_floor:
+        egg_entity = egg_entity_by_floor[floor_number]
         room = random.choice(rooms)
         isPlaced = False
         while not isPlaced:
@@ -235,4 +275,176 @@ def generate_dungeon(
                 egg_entity.spawn(dungeon, x, y)
                 isPlaced = True
 
-    return dungeon
\ No newline at end of file
+
+@tracing.traced("generate_bsp_dungeon")
+def generate_bsp_dungeon(
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    engine: "Engine",
+) -> GameMap:
+    """用二叉空间分割生成地牢。
+
+    地图沿较长的一边递归切分，直到区域小于 room_max_size + 2 的两倍，每个叶子区域放一个房间，
+    因此房间数只取决于地图大小，生成时间有确定的上界（不会像随机重试那样卡住）。
+    每次切分后用一条隧道连接两侧各一个房间，保证所有房间连通。
+    """
+    player = engine.player
+    floor_number = engine.game_world.current_floor
+    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+
+    rooms: List[RectangularRoom] = []
+    tunnels: List[Tuple[slice, slice]] = []
+    # 叶子区域的最小边长，保证放得下最大的房间
+    min_size = room_max_size + 2
+
+    def split(x: int, y: int, width: int, height: int) -> RectangularRoom:
+        """切分区域并连接两侧，返回该区域的代表房间，用来与兄弟区域相连。"""
+        if width >= 2 * min_size and (width >= height or height < 2 * min_size):
+            cut = random.randint(min_size, width - min_size)
+            first, second = split(x, y, cut, height), split(x + cut, y, width - cut, height)
+        elif height >= 2 * min_size:
+            cut = random.randint(min_size, height - min_size)
+            first, second = split(x, y, width, cut), split(x, y + cut, width, height - cut)
+        else:
+            # 叶子区域：RectangularRoom 的边界是墙，内部为 x1+1..x2-1，所以房间要比区域小一格
+            room_width = random.randint(room_min_size, min(room_max_size, width - 1))
+            room_height = random.randint(room_min_size, min(room_max_size, height - 1))
+            room = RectangularRoom(
+                random.randint(x, x + width - room_width - 1),
+                random.randint(y, y + height - room_height - 1),
+                room_width,
+                room_height,
+            )
+            dungeon.tiles[room.inner] = tile_types.floor
+            rooms.append(room)
+            return room
+
+        tunnels.extend(tunnel_between(first.center, second.center))
+        return random.choice((first, second))
+
+    # 外圈留一格墙壁
+    split(1, 1, map_width - 2, map_height - 2)
+    carve_tunnels(dungeon, tunnels)
+
+    player.place(*rooms[0].center, dungeon)
+
+    # 楼梯放在离起始房间最远的房间中心
+    start_x, start_y = rooms[0].center
+    stairs_room = max(rooms, key=lambda room: (room.center[0] - start_x) ** 2 + (room.center[1] - start_y) ** 2)
+    dungeon.tiles[stairs_room.center] = tile_types.down_stairs
+    dungeon.downstairs_location = stairs_room.center
+    dungeon.mark_terrain_changed()
+
+    place_entities(rooms, dungeon, floor_number)
+    place_egg(rooms, dungeon, floor_number)
+
+    return dungeon
+
+
+# 洞穴中平均每多少格地面放置一组敌人和物品，与房间的面积相当
+CAVE_TILES_PER_AREA = 80
+
+
+def count_wall_neighbours(wall: np.ndarray) -> np.ndarray:
+    """每个格子周围 8 格中墙的数量，地图外算作墙。"""
+    width, height = wall.shape
+    padded = np.pad(wall, 1, constant_values=True).astype(np.uint8)
+    count = np.zeros((width, height), dtype=np.uint8)
+    for dx in range(3):
+        for dy in range(3):
+            if dx != 1 or dy != 1:
+                count += padded[dx:dx + width, dy:dy + height]
+    return count
+
+
+def flood_distance(passable: np.ndarray, start: Tuple[int, int]) -> np.ndarray:
+    """从 `start` 出发、允许斜向移动的步数；无法到达的格子为 int32 最大值。"""
+    distance = np.full(passable.shape, np.iinfo(np.int32).max, dtype=np.int32)
+    distance[start] = 0
+    tcod.path.dijkstra2d(distance, passable.astype(np.int8), cardinal=1, diagonal=1, out=distance)
+    return distance
+
+
+@tracing.traced("generate_caves")
+def generate_caves(
+    map_width: int,
+    map_height: int,
+    engine: "Engine",
+    areas: Optional[int] = None,
+    fill_probability: float = 0.45,
+    smoothing_steps: int = 4,
+) -> GameMap:
+    """用元胞自动机生成洞穴地图。
+
+    随机填充墙壁后整体平滑几次（邻居计数全部用数组运算完成），
+    然后只保留玩家所在的连通区域，其余封闭的空洞填回墙壁。
+    楼梯放在离玩家最远的可达位置。
+
+    `areas` 是放置敌人和物品的组数，相当于房间数；默认按洞穴面积计算。
+    """
+    player = engine.player
+    floor_number = engine.game_world.current_floor
+    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+
+    # 地形用 numpy 的生成器，种子取自全局 random，保证录像可以重现
+    rng = np.random.default_rng(random.getrandbits(64))
+    wall = rng.random((map_width, map_height)) < fill_probability
+    for _ in range(smoothing_steps):
+        neighbours = count_wall_neighbours(wall)
+        wall = (neighbours >= 5) | (wall & (neighbours >= 4))
+    wall[[0, -1], :] = True
+    wall[:, [0, -1]] = True
+
+    # 随机选一个地面格子作为起点，越大的区域越容易被选中；
+    # 通常第一次就落在主洞穴里，只需一次泛洪
+    floor = ~wall
+    remaining = floor.copy()
+    region = np.zeros_like(floor)
+    distance = np.zeros(floor.shape, dtype=np.int32)
+    start = (map_width // 2, map_height // 2)
+    while remaining.sum() > region.sum():
+        cells = np.flatnonzero(remaining)
+        candidate = np.unravel_index(cells[rng.integers(len(cells))], floor.shape)
+        candidate_distance = flood_distance(floor, candidate)
+        reached = candidate_distance != np.iinfo(np.int32).max
+        remaining &= ~reached
+        if reached.sum() > region.sum():
+            region, distance, start = reached, candidate_distance, (int(candidate[0]), int(candidate[1]))
+    region[start] = True
+
+    dungeon.tiles[region] = tile_types.floor
+    player.place(*start, dungeon)
+
+    # 楼梯放在离起点最远的位置
+    stairs = np.unravel_index(np.argmax(np.where(region, distance, -1)), region.shape)
+    dungeon.downstairs_location = int(stairs[0]), int(stairs[1])
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+    dungeon.mark_terrain_changed()
+
+    cells = np.flatnonzero(region)
+    occupied: Set[Tuple[int, int]] = {start}
+
+    def free_cell() -> Tuple[int, int]:
+        """随机选一个还没有实体的地面格子。"""
+        while True:
+            x, y = np.unravel_index(cells[random.randrange(len(cells))], region.shape)
+            if (x, y) not in occupied:
+                occupied.add((int(x), int(y)))
+                return int(x), int(y)
+
+    if areas is None:
+        areas = max(1, len(cells) // CAVE_TILES_PER_AREA)
+    free_cells = len(cells) - 1
+    for entities in SpawnTable(floor_number).roll(areas):
+        for entity in entities:
+            if free_cells <= 0:
+                break
+            entity.spawn(dungeon, *free_cell())
+            free_cells -= 1
+
+    if floor_number in egg_entity_by_floor and free_cells > 0:
+        egg_entity_by_floor[floor_number].spawn(dungeon, *free_cell())
+
+    return dungeon
@@ -0,0 +1,70 @@
+"""逐帧统计各阶段耗时，供调试叠加层显示。"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Tuple
+
+import numpy as np  # type: ignore
+
+# 直方图的分桶上界（毫秒），最后一个桶收纳所有更慢的样本
+HISTOGRAM_BOUNDS_MS = (0.25, 0.5, 1, 2, 4, 8, 16, 33)
+
+
+class FrameProfiler:
+    """记录最近 `history` 帧中每个阶段的耗时。
+
+    同一帧内同名阶段的耗时会累加；只有在该帧出现过的阶段才会记录样本。
+    关闭时 `phase` 几乎没有开销。
+    """
+
+    def __init__(self, history: int = 240):
+        self.history = history
+        self.enabled = False
+        self.samples: Dict[str, Deque[float]] = {}
+        self._current: Dict[str, float] = {}
+        self._frame_start = time.perf_counter()
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        self.samples.clear()
+        self._current.clear()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[name] = self._current.get(name, 0.0) + time.perf_counter() - start
+
+    def begin_frame(self) -> None:
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self) -> None:
+        """结束当前帧，把本帧的阶段耗时加入历史记录。"""
+        if not self.enabled:
+            return
+        self._current["frame"] = time.perf_counter() - self._frame_start
+        for name, seconds in self._current.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.history)
+            self.samples[name].append(seconds * 1000)
+        self._current = {}
+
+    def percentiles(self, name: str) -> Tuple[float, float, float]:
+        """返回某阶段最近样本的 p50、p95、p99（毫秒）。"""
+        p50, p95, p99 = np.percentile(self.samples[name], [50, 95, 99])
+        return float(p50), float(p95), float(p99)
+
+    def histogram(self, name: str) -> List[int]:
+        """返回某阶段最近样本按 HISTOGRAM_BOUNDS_MS 分桶后的计数。"""
+        indices = np.searchsorted(HISTOGRAM_BOUNDS_MS, np.fromiter(self.samples[name], dtype=float))
+        return np.bincount(indices, minlength=len(HISTOGRAM_BOUNDS_MS) + 1).tolist()
+
+
+frame_profiler = FrameProfiler()
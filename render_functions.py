@@ -2,13 +2,20 @@ from __future__ import annotations
 
 from typing import Tuple, TYPE_CHECKING
 
+from tcod.constants import CENTER
+
 import color
 import game_config
+from profiler import HISTOGRAM_BOUNDS_MS
 
 if TYPE_CHECKING:
     from tcod import Console
     from engine import Engine
     from game_map import GameMap
+    from profiler import FrameProfiler
+
+# 直方图从空到满使用的字符
+PROFILER_LEVELS = " .:-=+*#"
 
 def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
     if not game_map.in_bounds(x, y) or not game_map.visible[x, y]:
@@ -71,3 +78,32 @@ def render_margin(console: Console, x: int, y: int) -> None:
 def render_tip(console: Console, location: Tuple[int, int], tip: str) -> None:
     x, y = location
     console.print(x=x, y=y, string=tip)
+
+def render_profiler(console: Console, profiler: FrameProfiler, location: Tuple[int, int]) -> None:
+    """
+    渲染各阶段耗时的 p50/p95/p99（毫秒）以及最近样本的直方图。
+    直方图每一列对应一个耗时区间，字符越密表示落在该区间的帧越多。
+    """
+    x, y = location
+    names = sorted(profiler.samples)
+    legend = f"<{HISTOGRAM_BOUNDS_MS[0]}..>{HISTOGRAM_BOUNDS_MS[-1]}ms"
+    width = 24 + 3 * 7 + 1 + max(len(legend), len(HISTOGRAM_BOUNDS_MS) + 1) + 2
+    height = len(names) + 3
+
+    console.draw_frame(x=x, y=y, width=width, height=height, bg=color.black)
+    console.print(x=x + width // 2, y=y, string="┤Profiler├", alignment=CENTER)
+    console.print(x=x + 1, y=y + 1, string=f"{'phase':<24}{'p50':>7}{'p95':>7}{'p99':>7} {legend}")
+
+    for i, name in enumerate(names):
+        p50, p95, p99 = profiler.percentiles(name)
+        counts = profiler.histogram(name)
+        peak = max(counts) or 1
+        bars = "".join(
+            PROFILER_LEVELS[min(len(PROFILER_LEVELS) - 1, -(-count * (len(PROFILER_LEVELS) - 1) // peak))]
+            for count in counts
+        )
+        console.print(
+            x=x + 1,
+            y=y + 2 + i,
+            string=f"{name:<24}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f} {bars}",
+        )
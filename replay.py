@@ -0,0 +1,198 @@
+"""录像：记录一局游戏的种子和玩家的每个动作，之后可以在无窗口模式下快速重放。
+
+新游戏开始时以 `seed` 重置全局 `random`，之后游戏中的所有随机数都来自它，
+因此同一个种子加上同样的动作序列一定得到同样的结果。录像随存档一起保存，
+继续游戏时会接着记录；读档时也会恢复随机数状态。
+
+文件格式：HEADER（魔数、版本、种子、动作数、结束时的状态摘要），
+之后是 zlib 压缩的定长记录，每条记录是一个操作码和三个参数。
+RUN、TRAVEL、EXPLORE 的第三个参数是玩家按键停止时已执行的回合数，0 表示没有中途停止。
+
+    python main.py --replay crash.replay
+"""
+from __future__ import annotations
+
+import hashlib
+import struct
+import time
+import zlib
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import actions
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from input_handlers import MainGameEventHandler
+
+MAGIC = b"TOAR"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHQI32s")  # 魔数、版本、种子、记录数、状态摘要
+RECORD = struct.Struct("<BhhH")  # 操作码、三个参数（第三个参数不会是负数）
+
+BUMP, WAIT, PICKUP, ITEM, DROP, EQUIP, STAIRS, RUN, TRAVEL, EXPLORE, LEVEL_UP = range(11)
+
+CRASH_FILE = "crash.replay"
+
+
+class Replay:
+    """一局游戏的种子和已记录的动作。"""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.records = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.records) // RECORD.size
+
+    def add(self, opcode: int, a: int = 0, b: int = 0, c: int = 0) -> None:
+        self.records += RECORD.pack(opcode, a, b, c)
+
+    def record_action(self, action: actions.Action) -> None:
+        """记录玩家通过 EventHandler.handle_action 执行的动作。"""
+        if isinstance(action, actions.EscapeAction):
+            return  # 退出游戏不影响状态
+        player = action.entity
+        if isinstance(action, actions.DropItem):
+            self.add(DROP, player.inventory.items.index(action.item))
+        elif isinstance(action, actions.ItemAction):
+            self.add(ITEM, player.inventory.items.index(action.item), *action.target_xy)
+        elif isinstance(action, actions.EquipAction):
+            self.add(EQUIP, player.inventory.items.index(action.item))
+        elif isinstance(action, actions.BumpAction):
+            self.add(BUMP, action.dx, action.dy)
+        elif isinstance(action, actions.WaitAction):
+            self.add(WAIT)
+        elif isinstance(action, actions.PickupAction):
+            self.add(PICKUP)
+        elif isinstance(action, actions.TakeStairsAction):
+            self.add(STAIRS)
+        elif isinstance(action, actions.RunAction):
+            self.add(RUN, action.dx, action.dy, action.max_turns or 0)
+        elif isinstance(action, actions.TravelAction):
+            self.add(TRAVEL, *action.dest_xy, action.max_turns or 0)
+        elif isinstance(action, actions.AutoExploreAction):
+            self.add(EXPLORE, 0, 0, action.max_turns or 0)
+        else:
+            raise TypeError(f"{type(action).__name__} can not be recorded in a replay.")
+
+    def set_max_turns(self, index: int, turns: int) -> None:
+        """多回合动作被玩家中途停止：改写第 `index` 条记录，重放时执行 `turns` 个回合后停下。
+
+        一个回合都没有执行时删除这条记录。
+        """
+        offset = index * RECORD.size
+        if turns == 0:
+            del self.records[offset:offset + RECORD.size]
+            return
+        opcode, a, b, _ = RECORD.unpack_from(self.records, offset)
+        RECORD.pack_into(self.records, offset, opcode, a, b, turns)
+
+    def record_level_up(self, choice: int) -> None:
+        """记录升级时选择的属性（0 生命，1 力量，2 敏捷）。"""
+        self.add(LEVEL_UP, choice)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, int]]:
+        return RECORD.iter_unpack(bytes(self.records))
+
+    def save(self, filename: str, engine: Optional["Engine"] = None) -> None:
+        """写入文件；提供 `engine` 时同时记下当前状态的摘要，重放时用来校验。"""
+        digest = state_digest(engine) if engine is not None else bytes(32)
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, len(self), digest))
+            f.write(zlib.compress(bytes(self.records), 9))
+
+
+def load(filename: str) -> Tuple[Replay, bytes]:
+    """读取录像文件，返回录像和记录时的状态摘要。"""
+    with open(filename, "rb") as f:
+        magic, version, seed, count, digest = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filename} is not a replay file.")
+        records = zlib.decompress(f.read())
+    if len(records) != count * RECORD.size:
+        raise ValueError(f"{filename} is truncated.")
+    replay = Replay(seed)
+    replay.records = bytearray(records)
+    return replay, digest
+
+
+def state_digest(engine: "Engine") -> bytes:
+    """游戏状态的摘要，与实体在集合中的顺序无关。"""
+    player = engine.player
+    game_map = engine.game_map
+    state: List[object] = [
+        engine.game_world.current_floor,
+        (player.x, player.y, player.fighter.hp, player.fighter.max_hp),
+        (player.level.current_level, player.level.current_xp),
+        [item.name for item in player.inventory.items],
+        len(engine.message_log.messages),
+        sorted((actor.x, actor.y, actor.name, actor.fighter.hp) for actor in game_map.actors),
+        sorted((item.x, item.y, item.name) for item in game_map.items),
+        int(game_map.explored.sum()),
+    ]
+    return hashlib.sha256(repr(state).encode()).digest()
+
+
+def apply(handler: "MainGameEventHandler", record: Tuple[int, int, int, int]) -> None:
+    """把一条记录交给事件处理器执行，与游戏中的处理路径相同。"""
+    opcode, a, b, c = record
+    player = handler.engine.player
+    action: Optional[actions.Action] = None
+    if opcode == BUMP:
+        action = actions.BumpAction(player, a, b)
+    elif opcode == WAIT:
+        action = actions.WaitAction(player)
+    elif opcode == PICKUP:
+        action = actions.PickupAction(player)
+    elif opcode == ITEM:
+        action = actions.ItemAction(player, player.inventory.items[a], (b, c))
+    elif opcode == DROP:
+        action = actions.DropItem(player, player.inventory.items[a])
+    elif opcode == EQUIP:
+        action = actions.EquipAction(player, player.inventory.items[a])
+    elif opcode == STAIRS:
+        action = actions.TakeStairsAction(player)
+    elif opcode == RUN:
+        action = actions.RunAction(player, a, b)
+        action.max_turns = c or None
+    elif opcode == TRAVEL:
+        action = actions.TravelAction(player, a, b)
+        action.max_turns = c or None
+    elif opcode == EXPLORE:
+        action = actions.AutoExploreAction(player)
+        action.max_turns = c or None
+    elif opcode == LEVEL_UP:
+        (player.level.increase_max_hp, player.level.increase_power, player.level.increase_defense)[a]()
+        if handler.engine.replay is not None:
+            handler.engine.replay.record_level_up(a)
+        return
+    else:
+        raise ValueError(f"Unknown replay opcode {opcode}.")
+    handler.handle_action(action)
+
+
+def play(filename: str) -> None:
+    """无窗口地尽快重放录像，打印耗时并校验最终状态。"""
+    import input_handlers
+    import setup_game
+
+    replay, expected = load(filename)
+    engine = setup_game.new_game(replay.seed)
+    handler = input_handlers.MainGameEventHandler(engine)
+
+    start = time.perf_counter()
+    for record in replay:
+        apply(handler, record)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Replayed {len(replay)} actions (seed {replay.seed}) in {elapsed:.3f} s; "
+        f"floor {engine.game_world.current_floor}, player hp {engine.player.fighter.hp}/{engine.player.fighter.max_hp}"
+    )
+    if expected == bytes(32):
+        print("The replay has no recorded final state to compare against.")
+    elif state_digest(engine) == expected:
+        print("Final state matches the recording.")
+    else:
+        print("Final state DIFFERS from the recording.")
@@ -0,0 +1,230 @@
+"""存档文件格式：带版本文件头的压缩 pickle，支持分块流式读取。"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import lzma
+import os
+import pickle
+import struct
+import time
+import zlib
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import exceptions
+import game_config
+import tracing
+
+MAGIC = b"TOAK"
+FORMAT_VERSION = 2
+
+# 文件头前缀：魔数、格式版本
+PREFIX = struct.Struct("<4sH")
+# 版本 1：解压后的数据大小、压缩数据大小（固定为 lzma）
+HEADER_V1 = struct.Struct("<QQ")
+# 版本 2：压缩算法编号、压缩等级、解压后的数据大小、压缩数据大小
+HEADER_V2 = struct.Struct("<BBQQ")
+
+# 每次从文件读取的字节数
+CHUNK_SIZE = 1 << 16
+
+
+class _NullDecompressor:
+    """不压缩时使用的解压器，直接返回输入数据。"""
+
+    eof = True
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class Codec(NamedTuple):
+    codec_id: int
+    levels: range
+    default_level: int
+    compress: Callable[[bytes, int], bytes]
+    decompressor: Callable[[], Any]
+
+
+# 可用的压缩算法，全部来自标准库
+CODECS: Dict[str, Codec] = {
+    "none": Codec(0, range(0, 1), 0, lambda data, level: data, _NullDecompressor),
+    "lzma": Codec(1, range(0, 10), 6, lambda data, level: lzma.compress(data, preset=level), lzma.LZMADecompressor),
+    "zlib": Codec(2, range(0, 10), 6, lambda data, level: zlib.compress(data, level), zlib.decompressobj),
+    "gzip": Codec(
+        3,
+        range(0, 10),
+        6,
+        lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+        lambda: zlib.decompressobj(wbits=31),
+    ),
+    "bz2": Codec(4, range(1, 10), 9, lambda data, level: bz2.compress(data, level), bz2.BZ2Decompressor),
+}
+
+CODEC_NAMES = {codec.codec_id: name for name, codec in CODECS.items()}
+
+
+def get_codec(name: str, level: Optional[int] = None) -> Tuple[Codec, int]:
+    """返回 (Codec, 等级)，未指定等级时使用该算法的默认等级。"""
+    try:
+        codec = CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown save codec {name!r}, expected one of {sorted(CODECS)}.") from None
+    if level is None:
+        level = codec.default_level
+    if level not in codec.levels:
+        raise ValueError(f"Level {level} is out of range for save codec {name!r}.")
+    return codec, level
+
+
+@tracing.traced("write_save")
+def write_save(filename: str, obj: Any, codec: Optional[str] = None, level: Optional[int] = None) -> None:
+    """将对象序列化、压缩并写入带文件头的存档。
+
+    `codec` 和 `level` 默认取自 game_config.save_codec 和 game_config.save_level。
+    """
+    if codec is None:
+        codec, level = game_config.save_codec, game_config.save_level
+    save_codec, level = get_codec(codec, level)
+
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    compressed = save_codec.compress(payload, level)
+    with open(filename, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION))
+        f.write(HEADER_V2.pack(save_codec.codec_id, level, len(payload), len(compressed)))
+        f.write(compressed)
+
+
+class SaveLoader:
+    """分块读取并解压存档，可以在多帧之间逐步推进。
+
+    构造时会立即打开文件并校验文件头，因此文件不存在或格式错误会直接抛出异常。
+    压缩算法从文件头中读取；没有文件头的旧存档会被当作整段 lzma 数据读取。
+    """
+
+    def __init__(self, filename: str, verbose: bool = True):
+        self.filename = filename
+        self.verbose = verbose
+        self.timings: Dict[str, float] = {}
+        self.result: Optional[Any] = None
+
+        start = time.perf_counter()
+        self._file = open(filename, "rb")
+        try:
+            self._read_header()
+        except BaseException:
+            self._file.close()
+            raise
+        self.timings["header"] = time.perf_counter() - start
+
+        self._decompressor = CODECS[self.codec].decompressor()
+        self._chunks: List[bytes] = []
+        self._bytes_read = 0
+        self._bytes_decompressed = 0
+
+    def _read_header(self) -> None:
+        file_size = os.fstat(self._file.fileno()).st_size
+        prefix = self._file.read(PREFIX.size)
+
+        if prefix[:len(MAGIC)] != MAGIC:
+            # 旧版存档：整个文件就是 lzma 压缩数据
+            self._file.seek(0)
+            self.version = 0
+            self.codec = "lzma"
+            self.payload_size: Optional[int] = None
+            self.compressed_size = file_size
+            return
+
+        if len(prefix) < PREFIX.size:
+            raise exceptions.InvalidSaveFile("Save file header is truncated.")
+        _, self.version = PREFIX.unpack(prefix)
+
+        if self.version > FORMAT_VERSION:
+            raise exceptions.InvalidSaveFile(
+                f"Save file version {self.version} is newer than supported ({FORMAT_VERSION})."
+            )
+
+        header_struct = HEADER_V1 if self.version == 1 else HEADER_V2
+        header = self._file.read(header_struct.size)
+        if len(header) < header_struct.size:
+            raise exceptions.InvalidSaveFile("Save file header is truncated.")
+
+        if self.version == 1:
+            self.codec = "lzma"
+            self.payload_size, self.compressed_size = header_struct.unpack(header)
+        else:
+            codec_id, _, self.payload_size, self.compressed_size = header_struct.unpack(header)
+            if codec_id not in CODEC_NAMES:
+                raise exceptions.InvalidSaveFile(f"Unknown save codec id {codec_id}.")
+            self.codec = CODEC_NAMES[codec_id]
+
+        header_size = PREFIX.size + header_struct.size
+        if self.compressed_size != file_size - header_size:
+            raise exceptions.InvalidSaveFile(
+                f"Save file is {file_size - header_size} bytes, header says {self.compressed_size}."
+            )
+
+    @property
+    def progress(self) -> float:
+        """返回 0 到 1 之间的读取进度。"""
+        if self.result is not None or not self.compressed_size:
+            return 1.0
+        return min(self._bytes_read / self.compressed_size, 1.0)
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @tracing.traced("SaveLoader.step")
+    def step(self, budget: float = 0.01) -> bool:
+        """在 `budget` 秒内尽量多地解压数据，全部完成后反序列化。
+
+        完成时返回 True，之后可以从 `result` 取得对象。
+        """
+        if self.done:
+            return True
+
+        start = time.perf_counter()
+        deadline = start + budget
+        while True:
+            chunk = self._file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self._bytes_read += len(chunk)
+            data = self._decompressor.decompress(chunk)
+            self._bytes_decompressed += len(data)
+            self._chunks.append(data)
+            if time.perf_counter() >= deadline:
+                self.timings["decompress"] = self.timings.get("decompress", 0.0) + time.perf_counter() - start
+                return False
+        self.timings["decompress"] = self.timings.get("decompress", 0.0) + time.perf_counter() - start
+
+        self.close()
+        if not self._decompressor.eof:
+            raise exceptions.InvalidSaveFile("Save file is truncated.")
+        if self.payload_size is not None and self._bytes_decompressed != self.payload_size:
+            raise exceptions.InvalidSaveFile(
+                f"Save data is {self._bytes_decompressed} bytes, header says {self.payload_size}."
+            )
+
+        start = time.perf_counter()
+        payload = b"".join(self._chunks)
+        self._chunks = []
+        self.result = pickle.loads(payload)
+        self.timings["unpickle"] = time.perf_counter() - start
+
+        if self.verbose:
+            print(
+                f"Loaded {self.filename} (v{self.version}, {self.codec}, {self.compressed_size} -> {len(payload)} bytes): "
+                + ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.timings.items())
+            )
+        return True
+
+    def load(self) -> Any:
+        """一次性读取整个存档并返回对象。"""
+        while not self.step(budget=float("inf")):
+            pass
+        return self.result
+
+    def close(self) -> None:
+        self._file.close()
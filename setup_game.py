@@ -2,38 +2,53 @@
 from __future__ import annotations
 
 import copy
-from typing import Optional
+import random
+from typing import Optional, TYPE_CHECKING
 
 import tcod
 
+import asset_cache
 import color
-from engine import Engine
-import entity_factories
-from game_map import GameWorld
 import input_handlers
 
-import lzma
-import pickle
 import traceback
 
 import game_config
-from loadImage import load_and_resize_image
+from save_format import SaveLoader
+
+if TYPE_CHECKING:
+    from engine import Engine
 
 
 # Load the background image and remove the alpha channel.
 # background_image = tcod.image.load("assets/menu_background.png")[:, :, :3]
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
-    map_width = game_config.screen_width
-    map_height = game_config.screen_height - game_config.log_height - game_config.mouse_description
+def new_game(seed: Optional[int] = None) -> Engine:
+    """Return a brand new game session as an Engine instance.
+
+    The whole session draws from the global `random` seeded with `seed`, so
+    the seed and the recorded player actions reproduce it exactly.
+    """
+    # 实体原型和地图模块在开始新游戏时才加载，主菜单可以更早显示
+    from engine import Engine
+    import entity_factories
+    from game_map import GameWorld
+    from replay import Replay
+
+    if seed is None:
+        seed = random.getrandbits(32)
+    random.seed(seed)
+
+    map_width = game_config.map_width
+    map_height = game_config.map_height
 
     
 
     player = copy.deepcopy(entity_factories.player)
 
     engine = Engine(player=player)
+    engine.replay = Replay(seed)
 
     engine.game_world = GameWorld(
         engine=engine,
@@ -68,18 +83,66 @@ def new_game() -> Engine:
 
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+    from engine import Engine
+
+    engine = SaveLoader(filename).load()
     assert isinstance(engine, Engine)
     return engine
 
 
+class LoadGameHandler(input_handlers.BaseEventHandler):
+    """在主菜单上显示读取进度，每帧推进一小段存档解压。"""
+
+    def __init__(self, parent: input_handlers.BaseEventHandler, loader: SaveLoader):
+        self.parent = parent
+        self.loader = loader
+
+    def on_update(self) -> input_handlers.BaseEventHandler:
+        from engine import Engine
+
+        try:
+            if not self.loader.step(budget=0.01):
+                return self
+            engine = self.loader.result
+            assert isinstance(engine, Engine)
+        except Exception as exc:
+            traceback.print_exc()  # Print to stderr.
+            return input_handlers.PopupMessage(parent_handler=self.parent, text=f"Failed to load save:\n{exc}")
+        return input_handlers.MainGameEventHandler(engine)
+
+    def on_render(self, console: tcod.console.Console) -> None:
+        self.parent.on_render(console)
+
+        width = game_config.menu_width
+        x = console.width // 4 - width // 2
+        y = console.height // 2 + 4
+        filled = int(self.loader.progress * width)
+
+        console.draw_rect(x=x, y=y, width=width, height=1, ch=1, bg=color.bar_empty)
+        if filled > 0:
+            console.draw_rect(x=x, y=y, width=filled, height=1, ch=1, bg=color.bar_filled)
+        console.print(
+            x=x + width // 2,
+            y=y,
+            string=f"Loading... {self.loader.progress:.0%}",
+            fg=color.bar_text,
+            alignment=tcod.CENTER,
+        )
+
+    def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[input_handlers.BaseEventHandler]:
+        """ESC 取消读取并返回主菜单。"""
+        if event.sym == tcod.event.KeySym.ESCAPE:
+            self.loader.close()
+            return self.parent
+        return None
+
+
 class MainMenu(input_handlers.BaseEventHandler):
     """Handle the main menu rendering and input."""
 
     def on_render(self, console: tcod.console.Console) -> None:
         """Render the main menu on a background image."""
-        background_image = load_and_resize_image("assets/menu_background.png", game_config.screen_width * 2, game_config.screen_height * 2)
+        background_image = asset_cache.load_background(asset_cache.MENU_BACKGROUND)
         console.draw_semigraphics(background_image, 0, 0)
 
         console.print(
@@ -117,7 +180,7 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.KeySym.c:
             try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+                return LoadGameHandler(self, SaveLoader("savegame.sav"))
             except FileNotFoundError:
                 return input_handlers.PopupMessage(parent_handler=self, text="No saved game to load.")
             except Exception as exc:
@@ -0,0 +1,71 @@
+"""启动耗时分析：用 `python -X importtime` 在子进程中导入 main，并汇总各模块的导入耗时。
+
+通过命令行参数 --startup-profile 启用。打包后的可执行文件不支持 -X 选项，此时只给出提示。
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """解析 `-X importtime` 写到 stderr 的内容。"""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        records.append(ImportRecord(module.rstrip(), depth, int(self_us), int(cumulative_us)))
+    return records
+
+
+def report(module: str = "main", top: int = 15) -> None:
+    """在子进程中导入 `module`，打印导入总耗时、其直接依赖以及自身耗时最多的模块。"""
+    if getattr(sys, "frozen", False):
+        print("--startup-profile needs a Python interpreter; it is not available in the packaged build.")
+        return
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr)
+        return
+
+    records = parse_importtime(result.stderr)
+    end = next(i for i, record in enumerate(records) if record.module == module and record.depth == 0)
+    root = records[end]
+    # 子模块先于父模块输出，上一条深度为 0 的记录之后、根模块之前深度为 1 的记录就是它的直接依赖
+    first = max((i + 1 for i in range(end) if records[i].depth == 0), default=0)
+    children = [record for record in records[first:end] if record.depth == 1]
+
+    def ms(us: int) -> str:
+        return f"{us / 1000:8.1f} ms"
+
+    print(f"import {module}: {ms(root.cumulative_us)} (process wall time {wall * 1000:.1f} ms)")
+    print(f"\nDirect imports of {module} (cumulative):")
+    for record in sorted(children, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"  {ms(record.cumulative_us)}  {record.module}")
+
+    print("\nSlowest modules (self):")
+    for record in sorted(records, key=lambda r: r.self_us, reverse=True)[:top]:
+        print(f"  {ms(record.self_us)}  {record.module}")
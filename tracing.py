@@ -0,0 +1,106 @@
+"""引擎各阶段的埋点，导出为 Chrome trace event 格式的 JSON。
+
+通过环境变量 TOAK_TRACE=<文件> 或命令行参数 --trace <文件> 启用，
+生成的文件可以直接在 chrome://tracing 或 https://ui.perfetto.dev 中打开。
+未启用时 `span` 返回一个共享的空上下文管理器，几乎没有开销。
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, List, Optional, TypeVar
+
+ENV_VAR = "TOAK_TRACE"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_NULL_SPAN = contextlib.nullcontext()
+
+_events: Optional[List[Dict[str, Any]]] = None
+_filename: Optional[str] = None
+_origin_ns = 0
+
+
+def enabled() -> bool:
+    return _events is not None
+
+
+def start(filename: str) -> None:
+    """开始记录，进程退出时自动写入 `filename`。"""
+    global _events, _filename, _origin_ns
+    if _events is None:
+        atexit.register(flush)
+    _events = []
+    _filename = filename
+    _origin_ns = time.perf_counter_ns()
+
+
+def start_from_env() -> None:
+    """如果设置了 TOAK_TRACE 环境变量则开始记录。"""
+    filename = os.environ.get(ENV_VAR)
+    if filename:
+        start(filename)
+
+
+class _Span:
+    __slots__ = ("name", "args", "start_ns")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self) -> "_Span":
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end_ns = time.perf_counter_ns()
+        if _events is None:
+            return
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start_ns - _origin_ns) / 1000,
+            "dur": (end_ns - self.start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        _events.append(event)
+
+
+def span(name: str, **args: Any) -> ContextManager[Any]:
+    """记录一个从进入到退出的时间段，`args` 会显示在 trace 查看器的详情中。"""
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """把整个函数调用记录为一个时间段的装饰器。"""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _events is None:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore
+    return decorator
+
+
+def flush() -> None:
+    """把目前记录的所有事件写入文件。"""
+    if _events is None or _filename is None:
+        return
+    import json
+
+    with open(_filename, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+    print(f"Wrote {len(_events)} trace events to {_filename}")